@@ -0,0 +1,197 @@
+# Headless batch runner: the same profile -> chain1 -> advice pipeline as the app, over a
+# file of profiles instead of the Streamlit form.
+#
+#   python batch_cli.py profiles.jsonl -o results.jsonl --advice "Budget Breakdown" --concurrency 8
+#   python batch_cli.py profiles.csv -o results.jsonl --all-advice --fake-llm
+#   python batch_cli.py profiles.jsonl -o results.jsonl --all-advice --local-backend ollama --local-model llama3.2:3b
+#
+# Input is JSONL (one financial_data object per line, optionally with an "id") or CSV (see
+# financial_profile.profile_from_record for the columns). Profiles are read and results written
+# one at a time, with at most --concurrency profiles in flight, so memory stays flat however
+# large the file is. Finished ids are appended to a checkpoint file; rerunning the same command
+# skips them, so an interrupted run picks up where it stopped. Failed profiles are reported on
+# stderr and not checkpointed, so they are retried on the next run.
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from langchain_core.globals import set_llm_cache
+
+from cache import make_cache
+from chains import ADVICE_TYPES, build_advice_chains, build_profiling_chain
+from financial_profile import profile_from_record, profile_inputs
+from instrumentation import call_log, llm_call_config
+from llm_pool import LLMExecutor, RateLimitedChatModel
+from model_router import DEFAULT_LOCAL_ADVICE, LOCAL_BACKENDS, make_local_llm, route_advice_llms
+
+
+def read_profiles(path):
+    """Yield (id, financial_data) for every record in a JSONL or CSV file. A record that can't
+    be parsed is yielded as (id, the exception), so one bad line doesn't stop the run."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            records = csv.DictReader(f)
+        else:
+            records = (line for line in f if line.strip())
+        for n, record in enumerate(records, start=1):
+            profile_id = str(n)
+            try:
+                if isinstance(record, str):
+                    record = json.loads(record)
+                profile_id = str(record.get("id") or n)
+                financial_data = profile_from_record(record)
+            except Exception as e:
+                financial_data = e
+            yield profile_id, financial_data
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def run_pipeline(financial_data, chain1, advice_chains, advice_types):
+    """Analysis + the requested advice for one profile, as the app would produce them."""
+    inputs = profile_inputs(financial_data)
+    analysis = chain1.invoke(inputs, llm_call_config("Analyze my finances"))
+    advice_inputs = {**inputs, "analyzed_response": analysis}
+    return {
+        "analyzed_response": analysis,
+        "advice": {
+            advice_type: advice_chains[advice_type].invoke(advice_inputs, llm_call_config(advice_type))
+            for advice_type in advice_types
+        },
+    }
+
+
+def run_batch(profiles, chain1, advice_chains, advice_types, output, checkpoint, concurrency=4):
+    """Run the pipeline over an iterable of (id, financial_data) with bounded concurrency.
+    Results are written to `output` as they finish; profiles that failed to parse or run are
+    reported on stderr. Returns (done, failed) counts."""
+    done_ids = load_checkpoint(checkpoint)
+    done = failed = 0
+
+    with open(output, "a", encoding="utf-8") as out, open(checkpoint, "a", encoding="utf-8") as ckpt, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = {}
+
+        def collect(finished):
+            nonlocal done, failed
+            for future in finished:
+                profile_id, started = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"profile {profile_id} failed: {e!r}", file=sys.stderr)
+                    continue
+                out.write(json.dumps({"id": profile_id, "seconds": round(time.perf_counter() - started, 3), **result}) + "\n")
+                out.flush()
+                ckpt.write(profile_id + "\n")
+                ckpt.flush()
+                done += 1
+
+        for profile_id, financial_data in profiles:
+            if profile_id in done_ids:
+                continue
+            if isinstance(financial_data, Exception):  # see read_profiles
+                failed += 1
+                print(f"profile {profile_id} could not be read: {financial_data!r}", file=sys.stderr)
+                continue
+            # Don't read further ahead than the worker pool can take
+            if len(in_flight) >= concurrency:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            future = pool.submit(run_pipeline, financial_data, chain1, advice_chains, advice_types)
+            in_flight[future] = (profile_id, time.perf_counter())
+        collect(wait(in_flight).done)
+    return done, failed
+
+
+def make_llm(args):
+    if args.fake_llm:
+        from fake_llm import FakeStreamingChatModel
+        llm = FakeStreamingChatModel(first_token_delay=args.fake_latency)
+    else:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(model_name=args.model, temperature=0, max_retries=0)  # the executor retries
+    executor = LLMExecutor(max_concurrency=args.llm_concurrency or args.concurrency,
+                           requests_per_minute=args.requests_per_minute,
+                           tokens_per_minute=args.tokens_per_minute)
+    return RateLimitedChatModel(llm=llm, executor=executor)
+
+
+def make_advice_llms(args, llm):
+    # Advice types answered by a local model, falling back to `llm` (see model_router.py)
+    if not args.local_backend:
+        return {}
+    local_llm = RateLimitedChatModel(llm=make_local_llm(args.local_backend, args.local_model, args.local_url),
+                                     executor=LLMExecutor(max_concurrency=args.local_concurrency),
+                                     timeout=args.local_timeout)
+    return route_advice_llms(local_llm, llm, tuple(args.local_advice) or DEFAULT_LOCAL_ADVICE)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the finance assistant pipeline over a file of profiles")
+    parser.add_argument("input", help="profiles as .jsonl or .csv")
+    parser.add_argument("-o", "--output", required=True, help="results file (JSONL, appended to)")
+    parser.add_argument("--checkpoint", help="finished ids file (default: <output>.checkpoint)")
+    parser.add_argument("--advice", action="append", choices=ADVICE_TYPES, default=[], help="advice type to generate (repeatable)")
+    parser.add_argument("--all-advice", action="store_true", help="generate every advice type")
+    parser.add_argument("--concurrency", type=int, default=4, help="profiles processed at the same time")
+    parser.add_argument("--llm-concurrency", type=int,
+                        help="LLM calls in flight at once (default: --concurrency, as each profile makes its calls one after another)")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--requests-per-minute", type=int, help="LLM request rate limit (default: none)")
+    parser.add_argument("--tokens-per-minute", type=int, help="LLM token rate limit (default: none)")
+    parser.add_argument("--token-budget", type=int, help="prompt token budget, see prompt_assembly.py (default: none)")
+    parser.add_argument("--cache", default="none", choices=("none", "memory", "sqlite", "tiered"), help="LLM response cache")
+    parser.add_argument("--fake-llm", action="store_true", help="use the offline fake model (no API calls)")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="seconds per fake model call")
+    parser.add_argument("--local-backend", choices=LOCAL_BACKENDS, help="answer some advice types with a local model")
+    parser.add_argument("--local-model", help="local model name (required with --local-backend)")
+    parser.add_argument("--local-url", help="local server URL (default: the backend's usual port on localhost)")
+    parser.add_argument("--local-advice", action="append", choices=ADVICE_TYPES, default=[],
+                        help="advice type for the local model (repeatable, default: %s)" % ", ".join(DEFAULT_LOCAL_ADVICE))
+    parser.add_argument("--local-concurrency", type=int, default=2, help="local model calls at the same time")
+    parser.add_argument("--local-timeout", type=float, default=10.0,
+                        help="seconds to the local model's first token, time queued included, before falling back to --model")
+    parser.add_argument("--metrics-jsonl", help="append one record per LLM call (latency, tokens, cache hit) to this file")
+    args = parser.parse_args(argv)
+
+    if not args.fake_llm and "OPENAI_API_KEY" not in os.environ:
+        parser.error("OPENAI_API_KEY is not set (or use --fake-llm)")
+    if args.local_backend and not args.local_model:
+        parser.error("--local-backend needs --local-model")
+
+    set_llm_cache(make_cache(args.cache, path=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "responses.sqlite")))
+    llm = make_llm(args)
+    chain1 = build_profiling_chain(llm, args.token_budget)
+    advice_llms = make_advice_llms(args, llm)
+    advice_chains = build_advice_chains(llm, args.token_budget, advice_llms)
+    advice_types = ADVICE_TYPES if args.all_advice else tuple(args.advice)
+
+    start = time.perf_counter()
+    done, failed = run_batch(read_profiles(args.input), chain1, advice_chains, advice_types,
+                             args.output, args.checkpoint or args.output + ".checkpoint", args.concurrency)
+    print(f"{done} profiles done, {failed} failed in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    for row in call_log.summary():
+        print(f"  {row['advice_type']}: {row['calls']} calls, {row['cache_hits']} cached, {row['errors']} errors, "
+              f"avg {row['avg_wall_s']:.2f}s, {row['prompt_tokens']}+{row['completion_tokens']} tokens", file=sys.stderr)
+    if advice_llms:
+        routing_stats = next(iter(advice_llms.values())).stats()
+        print(f"  local model: {routing_stats['primary']} answered, {routing_stats['fallback']} fell back to {args.model} "
+              f"{routing_stats['errors'] or ''}", file=sys.stderr)
+    if args.metrics_jsonl:
+        call_log.export_jsonl(args.metrics_jsonl)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
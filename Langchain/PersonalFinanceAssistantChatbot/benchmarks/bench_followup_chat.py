@@ -0,0 +1,106 @@
+# Follow-up chat: sending the whole conversation every turn vs the rolling summary memory.
+#
+#   python benchmarks/bench_followup_chat.py [--turns 50] [--memory-tokens 1000] [--prompt-token-delay 0.0001]
+#
+# Runs --turns follow-up questions against the fake chat model, whose time to first token grows
+# with the prompt (--prompt-token-delay seconds per prompt token, on top of --latency), once with
+# every earlier turn in the prompt ("full history") and once with chat_memory.ChatMemory
+# ("rolling summary": last --memory-tokens tokens verbatim, older turns folded into a summary).
+# Reports per mode: prompt tokens at a few turns, time to first token of the first and last ten
+# turns, the summarization calls and their time, and how much of each prompt repeats the previous
+# one from the start (the part provider-side prompt caching can reuse, counted per message).
+import argparse
+import statistics
+import time
+
+from common import SAMPLE_PROFILE
+from chains import build_followup_chain, build_summary_chain, prompt_followup
+from chat_memory import ChatMemory, chat_context
+from fake_llm import FakeStreamingChatModel
+from financial_profile import profile_inputs
+from tokens import MESSAGE_OVERHEAD, count_message_tokens, count_tokens
+
+QUESTIONS = (
+    "How much should I put towards the credit card each month?",
+    "Would it be better to pay off the student loan first?",
+    "How long until I have three months of expenses saved?",
+    "Can I afford to increase my 401(k) contribution?",
+    "What if my rent goes up by $200?",
+)
+
+
+def shared_prefix_tokens(previous, messages):
+    tokens = 0
+    for old, new in zip(previous, messages):
+        if old.type != new.type or old.content != new.content:
+            break
+        tokens += count_tokens(new.content) + MESSAGE_OVERHEAD
+    return tokens
+
+
+def run(memory, args):
+    llm = FakeStreamingChatModel(first_token_delay=args.latency, prompt_token_delay=args.prompt_token_delay,
+                                 token_delay=args.token_delay, response_words=args.words)
+    summarizer = FakeStreamingChatModel(first_token_delay=args.latency, prompt_token_delay=args.prompt_token_delay,
+                                        token_delay=args.token_delay, response_words=memory.summary_words)
+    followup_chain, summary_chain = build_followup_chain(llm), build_summary_chain(summarizer)
+
+    inputs = profile_inputs(SAMPLE_PROFILE)
+    context = chat_context(inputs["financial_data_str"], inputs["financial_metrics"], args.analysis)
+    prompt_tokens, first_token_s, reused, folds, fold_s = [], [], [], 0, 0.0
+    previous = []
+    for turn in range(args.turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        chat_inputs = memory.prompt_inputs(question, context)
+        messages = prompt_followup.format_messages(**chat_inputs)
+        prompt_tokens.append(count_message_tokens(messages))
+        if previous:
+            reused.append(shared_prefix_tokens(previous, messages) / prompt_tokens[-1])
+        previous = messages
+
+        start = time.perf_counter()
+        chunks = followup_chain.stream(chat_inputs)
+        answer = next(chunks)
+        first_token_s.append(time.perf_counter() - start)
+        answer += "".join(chunks)
+
+        memory.add_turn(question, answer)
+        if memory.needs_folding():
+            start = time.perf_counter()
+            memory.fold(summary_chain)
+            fold_s += time.perf_counter() - start
+            folds += 1
+    return prompt_tokens, first_token_s, reused, folds, fold_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Follow-up chat memory benchmark")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--memory-tokens", type=int, default=1000, help="recent turns kept verbatim (ChatMemory)")
+    parser.add_argument("--summary-words", type=int, default=150)
+    parser.add_argument("--words", type=int, default=120, help="words per fake answer")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model seconds to first token")
+    parser.add_argument("--prompt-token-delay", type=float, default=0.0001,
+                        help="fake model extra seconds to first token per prompt token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="fake model seconds between tokens")
+    args = parser.parse_args()
+    args.analysis = FakeStreamingChatModel(response_words=400).invoke("analysis").content
+
+    modes = {
+        "full history": ChatMemory(max_recent_tokens=float("inf")),
+        "rolling summary": ChatMemory(max_recent_tokens=args.memory_tokens, summary_words=args.summary_words),
+    }
+    marks = sorted({1, 10, args.turns // 2, args.turns})
+    print(f"{args.turns} turns, {args.words} words per answer, "
+          f"first token after {args.latency}s + {args.prompt_token_delay * 1000:.2f}ms per prompt token")
+    print(f"{'':<16} " + " ".join(f"{f'tokens@{mark}':>10}" for mark in marks)
+          + f" {'ttft 1-10':>10} {'ttft last10':>11} {'prefix reuse':>12} {'folds':>6} {'fold s':>7}")
+    for name, memory in modes.items():
+        prompt_tokens, first_token_s, reused, folds, fold_s = run(memory, args)
+        print(f"{name:<16} " + " ".join(f"{prompt_tokens[mark - 1]:>10}" for mark in marks)
+              + f" {statistics.mean(first_token_s[:10]):>10.3f} {statistics.mean(first_token_s[-10:]):>11.3f}"
+              + f" {statistics.mean(reused):>11.0%} {folds:>6} {fold_s:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Script reruns and server CPU time of filling in the profile, per edit vs as a form.
+#
+#   python benchmarks/bench_form_reruns.py [--repeat 3] [--json]
+#
+# Drives the app through AppTest with a user editing 13 profile fields and then clicking
+# "Analyze my finances", twice: on a blank page, and after an analysis, a full report and a few
+# chat turns (every rerun re-renders those, so reruns get more expensive as the page fills up).
+#   per edit  every edit reruns the whole script, as before the profile became a form
+#             (simulated with one rerun per edit on the current app)
+#   form      edits stay in the browser until the form is submitted: one rerun
+# Reports the reruns and the CPU time spent in them (time.process_time - AppTest runs the script
+# in this process) per mode, median of --repeat rounds. Runs offline with the fake model.
+import argparse
+import json
+import statistics
+import time
+
+from common import APP_DIR, SAMPLE_PROFILE
+from streamlit.testing.v1 import AppTest
+
+MAIN = f"{APP_DIR}/main.py"
+
+# One user's edits: income, the six expenses, savings, investments, goals, risk tolerance,
+# time frame and notes
+EDITS = (
+    lambda at: at.number_input[0].set_value(SAMPLE_PROFILE["income"]),
+    *(lambda at, n=n, field=field: at.number_input[1 + n].set_value(SAMPLE_PROFILE["expenses"][field])
+      for n, field in enumerate(("housing", "utilities", "groceries", "entertainment", "transportation", "other_expenses"))),
+    lambda at: at.number_input[7].set_value(SAMPLE_PROFILE["savings"]),
+    lambda at: at.text_area[0].input(SAMPLE_PROFILE["investments"]),
+    lambda at: at.multiselect[0].set_value(SAMPLE_PROFILE["financial_goals"]),
+    lambda at: at.radio[1].set_value(SAMPLE_PROFILE["risk_tolerance"]),
+    lambda at: at.selectbox[0].set_value("1 year"),
+    lambda at: at.text_area[1].input("Expecting a raise next spring."),
+)
+
+
+def new_app():
+    at = AppTest.from_file(MAIN, default_timeout=120)
+    at.secrets["OPENAI_API_KEY"] = "sk-benchmark"
+    at.secrets["LANGCHAIN_API_KEY"] = "benchmark"
+    at.secrets["USE_FAKE_LLM"] = True
+    at.secrets["CACHE_BACKEND"] = "none"
+    at.secrets["FAKE_LLM_LATENCY"] = 0
+    at.secrets["FAKE_LLM_TOKEN_DELAY"] = 0
+    at.secrets["FAKE_LLM_RESPONSE_WORDS"] = 300
+    at.run()
+    return at
+
+
+def button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def fill_page(at):
+    """An analysis, the full report and three chat turns on the page."""
+    at.number_input[0].set_value(4000)
+    button(at, "Analyze my finances").click().run()
+    button(at, "Generate Full Report").click().run()
+    for question in ("Can I save more?", "What about my credit card?", "Should I invest?"):
+        at.chat_input[0].set_value(question).run()
+
+
+def edit_profile(at, per_edit):
+    """Apply EDITS and analyze; returns (reruns, CPU seconds) of doing so."""
+    reruns = 0
+    cpu = time.process_time()
+    for edit in EDITS:
+        edit(at)
+        if per_edit:
+            at.run()
+            reruns += 1
+    if per_edit:
+        # AppTest, like the browser, drops form values that weren't submitted - apply them again
+        for edit in EDITS:
+            edit(at)
+    button(at, "Analyze my finances").click().run()
+    reruns += 1
+    return reruns, time.process_time() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reruns and CPU time of profile edits, per edit vs as a form")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print one JSON object per page/mode")
+    args = parser.parse_args()
+
+    fill_page(new_app())  # warm up: imports and cached resources aren't counted
+    results = []
+    for page in ("blank", "filled"):
+        for mode in ("per edit", "form"):
+            rounds = []
+            for _ in range(args.repeat):
+                at = new_app()
+                if page == "filled":
+                    fill_page(at)
+                rounds.append(edit_profile(at, per_edit=mode == "per edit"))
+                assert not at.exception, [e.message for e in at.exception]
+            results.append({"page": page, "mode": mode, "reruns": rounds[0][0],
+                            "cpu_s": statistics.median(cpu for _, cpu in rounds)})
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    print(f"{len(EDITS)} edits + analyze, median of {args.repeat}")
+    print(f"{'page':<8} {'mode':<9} {'reruns':>7} {'CPU s':>7} {'CPU ms/rerun':>13}")
+    for result in results:
+        print(f"{result['page']:<8} {result['mode']:<9} {result['reruns']:>7} {result['cpu_s']:>7.3f} "
+              f"{result['cpu_s'] / result['reruns'] * 1000:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
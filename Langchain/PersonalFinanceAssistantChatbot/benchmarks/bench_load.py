@@ -0,0 +1,213 @@
+# Offline load test: the real prompts and chains against the fake chat model.
+#
+#   python benchmarks/bench_load.py [--sessions 8] [--iterations 20] [--latency 0.3] [--token-delay 0.005] [--token-budget N]
+#   python benchmarks/bench_load.py --json > load.json   # one JSON object per scenario, for CI
+#
+# Scenarios (each runs in a fresh interpreter, so peak RSS is that scenario's own):
+#   single    one user: chain1 analysis, then one advice, streamed as the app does
+#   fanout    the six-advice full report (RunnableParallel over the advice chains)
+#   sessions  --sessions concurrent Streamlit sessions driven through AppTest: analyze, then
+#             detailed feedback. AppTest isn't thread-safe, so each session runs in its own
+#             process (peak RSS is then the largest session process)
+# For each: p50/p95 latency of one flow, throughput (flows/s), peak RSS, and for `sessions`
+# the median time of a rerun that doesn't call the LLM (e.g. picking another advice type; edits
+# in the profile form don't rerun the script until it is submitted).
+# The fake model waits --latency before the first token, then streams --words words with
+# --token-delay between them. The response cache is off, so every flow reaches the model.
+# Prompts are condensed to --token-budget tokens in every scenario, or not at all (the default).
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common import APP_DIR, SAMPLE_PROFILE
+
+SCENARIOS = ("single", "fanout", "sessions")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+
+def build_chains(args):
+    from chains import build_advice_chains, build_full_report_chain, build_profiling_chain
+    from fake_llm import FakeStreamingChatModel
+    from langchain_core.globals import set_llm_cache
+    from llm_pool import LLMExecutor, RateLimitedChatModel
+
+    set_llm_cache(None)
+    llm = RateLimitedChatModel(
+        llm=FakeStreamingChatModel(first_token_delay=args.latency, token_delay=args.token_delay, response_words=args.words),
+        executor=LLMExecutor(max_concurrency=64),
+    )
+    advice_chains = build_advice_chains(llm, args.token_budget)
+    return build_profiling_chain(llm, args.token_budget), advice_chains, build_full_report_chain(advice_chains)
+
+
+def profile(n):
+    # A different income per flow, so no two flows send the same prompt
+    return {**SAMPLE_PROFILE, "income": SAMPLE_PROFILE["income"] + 10 * n}
+
+
+def run_single(args):
+    from cache import stream_with_cache
+    from financial_profile import profile_inputs
+
+    chain1, advice_chains, _ = build_chains(args)
+    latencies = []
+    for n in range(args.iterations):
+        start = time.perf_counter()
+        inputs = profile_inputs(profile(n))
+        analysis = "".join(stream_with_cache(chain1, inputs))
+        "".join(stream_with_cache(advice_chains["Budget Breakdown"], {**inputs, "analyzed_response": analysis}))
+        latencies.append(time.perf_counter() - start)
+    return latencies, sum(latencies), {}
+
+
+def run_fanout(args):
+    from financial_profile import profile_inputs
+
+    chain1, _, full_report_chain = build_chains(args)
+    latencies = []
+    for n in range(args.iterations):
+        inputs = profile_inputs(profile(n))
+        inputs["analyzed_response"] = chain1.invoke(inputs)
+        start = time.perf_counter()
+        for _ in full_report_chain.stream(inputs):
+            pass
+        latencies.append(time.perf_counter() - start)
+    return latencies, sum(latencies), {}
+
+
+def new_session(n, args):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(APP_DIR, "main.py"), default_timeout=300)
+    at.secrets["OPENAI_API_KEY"] = "sk-benchmark"
+    at.secrets["LANGCHAIN_API_KEY"] = "benchmark"
+    at.secrets["USE_FAKE_LLM"] = True
+    at.secrets["CACHE_BACKEND"] = "none"
+    at.secrets["FAKE_LLM_LATENCY"] = args.latency
+    at.secrets["FAKE_LLM_TOKEN_DELAY"] = args.token_delay
+    at.secrets["FAKE_LLM_RESPONSE_WORDS"] = args.words
+    if args.token_budget:
+        at.secrets["PROMPT_TOKEN_BUDGET"] = args.token_budget
+    at.run()
+    at.number_input[0].set_value(SAMPLE_PROFILE["income"] + 10 * n)  # sent with the next "Analyze my finances"
+    return at
+
+
+def _set_barrier(barrier):
+    global start_barrier
+    start_barrier = barrier
+
+
+def session_worker(n, args):
+    """One session: analyze + detailed feedback, --iterations times. Runs in its own process."""
+    def button(label):
+        return next(b for b in at.button if b.label == label)
+
+    at = new_session(-1 - n, args)
+    button("Analyze my finances").click().run()  # warm up: loads LangChain and builds the chains (see bench_startup.py)
+    at.number_input[0].set_value(SAMPLE_PROFILE["income"] + 10 * n)
+    start_barrier.wait()
+    started = time.time()
+    latencies, reruns, errors = [], [], []
+    for n in range(args.iterations):
+        if n:
+            at.number_input[1].increment()  # edit the profile, so the next analysis calls the LLM again
+        start = time.perf_counter()
+        button("Analyze my finances").click().run()
+        button("Get Detailed Feedback").click().run()
+        latencies.append(time.perf_counter() - start)
+        errors.extend(e.message for e in at.exception)
+        # A rerun that doesn't call the LLM
+        start = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - start)
+    return latencies, reruns, errors, started, time.time(), peak_rss_mb()
+
+
+def run_sessions(args):
+    # AppTest swaps process-global Streamlit state on every run, so sessions can't share a
+    # process - each one gets its own (like one worker per session), started together
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(args.sessions, mp_context=context, initializer=_set_barrier,
+                             initargs=(context.Barrier(args.sessions),)) as pool:
+        results = list(pool.map(session_worker, range(args.sessions), [args] * args.sessions))
+    latencies = [latency for result in results for latency in result[0]]
+    reruns = [rerun for result in results for rerun in result[1]]
+    wall = max(result[4] for result in results) - min(result[3] for result in results)
+    return latencies, wall, {
+        "rerun_s": statistics.median(reruns),
+        "errors": sum(len(result[2]) for result in results),
+        "peak_rss_mb": max(result[5] for result in results),  # per session process
+    }
+
+
+def run_scenario(args):
+    sys.path.insert(0, APP_DIR)
+    latencies, wall, extra = {"single": run_single, "fanout": run_fanout, "sessions": run_sessions}[args.scenario](args)
+    return {
+        "scenario": args.scenario,
+        "flows": len(latencies),
+        "p50_s": percentile(latencies, 50) if latencies else None,
+        "p95_s": percentile(latencies, 95) if latencies else None,
+        "throughput_per_s": len(latencies) / wall if wall else None,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test with the fake chat model")
+    parser.add_argument("--scenario", choices=SCENARIOS, help="run only this scenario, in this process")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent AppTest sessions")
+    parser.add_argument("--iterations", type=int, default=5, help="flows per scenario (per session for `sessions`)")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="fake model seconds between tokens")
+    parser.add_argument("--words", type=int, default=200, help="words per fake model reply")
+    parser.add_argument("--token-budget", type=int,
+                        help="prompt token budget, as PROMPT_TOKEN_BUDGET in the app (default: none, like the app)")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per scenario (for CI)")
+    args = parser.parse_args()
+
+    if args.scenario:
+        results = [run_scenario(args)]
+    else:
+        results = []
+        for scenario in SCENARIOS:
+            command = [sys.executable, "-W", "ignore", os.path.abspath(__file__), "--json", "--scenario", scenario,
+                       "--sessions", str(args.sessions), "--iterations", str(args.iterations),
+                       "--latency", str(args.latency), "--token-delay", str(args.token_delay), "--words", str(args.words)]
+            if args.token_budget:
+                command += ["--token-budget", str(args.token_budget)]
+            output = subprocess.run(command, cwd=APP_DIR, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    print(f"{'scenario':<10} {'flows':>6} {'p50 s':>7} {'p95 s':>7} {'flows/s':>8} {'peak MB':>8} {'rerun s':>8}")
+    for result in results:
+        rerun = f"{result['rerun_s']:.3f}" if result.get("rerun_s") is not None else "-"
+        print(f"{result['scenario']:<10} {result['flows']:>6} {result['p50_s']:>7.2f} {result['p95_s']:>7.2f} "
+              f"{result['throughput_per_s']:>8.2f} {result['peak_rss_mb']:>8.0f} {rerun:>8}")
+        if result.get("errors"):
+            print(f"  {result['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
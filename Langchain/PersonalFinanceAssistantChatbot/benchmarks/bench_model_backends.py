@@ -0,0 +1,129 @@
+# Latency and throughput of the advice chains per model backend.
+#
+#   python benchmarks/bench_model_backends.py [--requests 12] [--concurrency 2]
+#   python benchmarks/bench_model_backends.py --ollama llama3.2:3b --openai-compatible qwen2.5-3b-instruct --openai
+#
+# Sends --requests advice requests (the advice types routed to the local model by default,
+# each for a different profile) through the app's chains, --concurrency at a time, and reports
+# per backend the time to first token and to the whole answer (p50/p95), requests per second,
+# and how many calls fell back to the main model.
+# Without options it compares simulated backends built from the fake chat model:
+#   remote            a hosted model: --remote-latency to the first token (network + queueing),
+#                     then --remote-token-delay per token
+#   local             a small model on this machine's CPU: no network, but prompt processing
+#                     (--local-prompt-token-delay per prompt token) and slower generation
+#                     (--local-token-delay per token), --local-concurrency calls at a time
+#   local, too slow   a local model that doesn't start answering within --local-timeout, so
+#                     every call falls back to remote (what an overloaded local server costs)
+# --ollama / --openai-compatible / --openai add the real servers (the last needs OPENAI_API_KEY).
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import SAMPLE_PROFILE
+from chains import build_advice_chains
+from fake_llm import FakeStreamingChatModel, filler_text
+from financial_profile import profile_inputs
+from llm_pool import LLMExecutor, RateLimitedChatModel
+from model_router import DEFAULT_LOCAL_ADVICE, DEFAULT_LOCAL_URLS, FallbackChatModel, make_local_llm
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)]
+
+
+def backends(args):
+    """Backend name -> chat model, each behind its own executor as in the app."""
+    def remote():
+        return RateLimitedChatModel(
+            llm=FakeStreamingChatModel(first_token_delay=args.remote_latency, token_delay=args.remote_token_delay,
+                                       response_words=args.words),
+            executor=LLMExecutor(max_concurrency=8))
+
+    def local(first_token_delay):
+        return RateLimitedChatModel(
+            llm=FakeStreamingChatModel(first_token_delay=first_token_delay, prompt_token_delay=args.local_prompt_token_delay,
+                                       token_delay=args.local_token_delay, response_words=args.words),
+            executor=LLMExecutor(max_concurrency=args.local_concurrency), timeout=args.local_timeout)
+
+    models = {
+        "remote": remote(),
+        "local": FallbackChatModel(primary=local(0.0), fallback=remote()),
+        "local, too slow": FallbackChatModel(primary=local(args.local_timeout * 2), fallback=remote()),
+    }
+    for backend, model in (("ollama", args.ollama), ("openai-compatible", args.openai_compatible)):
+        if model:
+            url = args.ollama_url if backend == "ollama" else args.openai_compatible_url
+            models[f"{backend} {model}"] = FallbackChatModel(
+                primary=RateLimitedChatModel(llm=make_local_llm(backend, model, url),
+                                             executor=LLMExecutor(max_concurrency=args.local_concurrency),
+                                             timeout=args.local_timeout),
+                fallback=remote())
+    if args.openai:
+        from langchain_openai import ChatOpenAI
+        models["openai gpt-4o"] = RateLimitedChatModel(llm=ChatOpenAI(model="gpt-4o", temperature=0, max_retries=0),
+                                                       executor=LLMExecutor(max_concurrency=8))
+    return models
+
+
+def run(model, args):
+    advice_chains = build_advice_chains(model, 1500, {advice_type: model for advice_type in DEFAULT_LOCAL_ADVICE})
+    analysis = filler_text(400)
+    first_token_s, total_s = [], []
+    lock = threading.Lock()
+
+    def request(n):
+        inputs = profile_inputs({**SAMPLE_PROFILE, "income": SAMPLE_PROFILE["income"] + 10 * n})
+        chain = advice_chains[DEFAULT_LOCAL_ADVICE[n % len(DEFAULT_LOCAL_ADVICE)]]
+        start = time.perf_counter()
+        chunks = chain.stream({**inputs, "analyzed_response": analysis})
+        next(chunks)
+        first_token = time.perf_counter() - start
+        for _ in chunks:
+            pass
+        with lock:
+            first_token_s.append(first_token)
+            total_s.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(request, range(args.requests)))
+    wall = time.perf_counter() - start
+    fallbacks = model.stats()["fallback"] if isinstance(model, FallbackChatModel) else None
+    return first_token_s, total_s, args.requests / wall, fallbacks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Advice latency and throughput per model backend")
+    parser.add_argument("--requests", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, default=2, help="requests in flight at once")
+    parser.add_argument("--words", type=int, default=150, help="words per simulated answer")
+    parser.add_argument("--remote-latency", type=float, default=0.6)
+    parser.add_argument("--remote-token-delay", type=float, default=0.01)
+    parser.add_argument("--local-prompt-token-delay", type=float, default=0.0002)
+    parser.add_argument("--local-token-delay", type=float, default=0.02)
+    parser.add_argument("--local-concurrency", type=int, default=2)
+    parser.add_argument("--local-timeout", type=float, default=1.0, help="seconds to first token before falling back")
+    parser.add_argument("--ollama", metavar="MODEL", help="also benchmark this model on an Ollama server")
+    parser.add_argument("--ollama-url", default=DEFAULT_LOCAL_URLS["ollama"])
+    parser.add_argument("--openai-compatible", metavar="MODEL", help="also benchmark this model on e.g. a llama.cpp server")
+    parser.add_argument("--openai-compatible-url", default=DEFAULT_LOCAL_URLS["openai-compatible"])
+    parser.add_argument("--openai", action="store_true", help="also benchmark gpt-4o")
+    args = parser.parse_args()
+    if args.openai and "OPENAI_API_KEY" not in os.environ:
+        parser.error("--openai needs OPENAI_API_KEY")
+
+    print(f"{args.requests} requests ({', '.join(DEFAULT_LOCAL_ADVICE)}), {args.concurrency} at a time")
+    print(f"{'backend':<28} {'ttft p50':>9} {'ttft p95':>9} {'total p50':>10} {'total p95':>10} {'req/s':>7} {'fallbacks':>10}")
+    for name, model in backends(args).items():
+        first_token_s, total_s, throughput, fallbacks = run(model, args)
+        print(f"{name:<28} {percentile(first_token_s, 50):>9.2f} {percentile(first_token_s, 95):>9.2f} "
+              f"{percentile(total_s, 50):>10.2f} {percentile(total_s, 95):>10.2f} {throughput:>7.2f} "
+              f"{'-' if fallbacks is None else fallbacks:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Compare prompt/completion token counts with and without the precomputed metrics.
+#
+#   python benchmarks/bench_precomputed_metrics.py          # prompt tokens only (offline)
+#   python benchmarks/bench_precomputed_metrics.py --live   # also completion tokens, calls gpt-4o
+#
+# "before" asks the model to work the figures out from the profile itself, "after" passes
+# the fact sheet from metrics.py. --live needs OPENAI_API_KEY in the environment.
+import argparse
+import time
+
+from common import SAMPLE_PROFILE, SAMPLE_PROFILE_STR
+
+from chains import ADVICE_PROMPTS, prompt_profiling
+from metrics import compute_metrics, format_metrics
+from tokens import count_message_tokens
+
+NO_METRICS = "Not provided - calculate any figures you need from the profile."
+PLACEHOLDER_ANALYSIS = "The user has a moderate income, high-interest credit card debt and a small emergency fund."
+
+
+def measure(prompt, inputs, llm):
+    messages = prompt.invoke(inputs).to_messages()
+    row = {"prompt_tokens": count_message_tokens(messages), "completion_tokens": None, "seconds": None}
+    if llm is not None:
+        start = time.perf_counter()
+        message = llm.invoke(messages)
+        row["seconds"] = time.perf_counter() - start
+        row["prompt_tokens"] = message.usage_metadata["input_tokens"]
+        row["completion_tokens"] = message.usage_metadata["output_tokens"]
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token counts with and without precomputed metrics")
+    parser.add_argument("--live", action="store_true", help="call gpt-4o to measure completion tokens and latency")
+    args = parser.parse_args()
+
+    llm = None
+    if args.live:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(model_name="gpt-4o", temperature=0)
+
+    metrics_str = format_metrics(compute_metrics(SAMPLE_PROFILE))
+    prompts = {"Analyze my finances": prompt_profiling, **ADVICE_PROMPTS}
+
+    print(f"{'prompt':<30} {'variant':<7} {'prompt tok':>10} {'compl tok':>10} {'seconds':>8}")
+    for name, prompt in prompts.items():
+        for variant, figures in (("before", NO_METRICS), ("after", metrics_str)):
+            inputs = {"financial_data_str": SAMPLE_PROFILE_STR, "financial_metrics": figures,
+                      "analyzed_response": PLACEHOLDER_ANALYSIS}
+            row = measure(prompt, inputs, llm)
+            completion = "-" if row["completion_tokens"] is None else row["completion_tokens"]
+            seconds = "-" if row["seconds"] is None else f"{row['seconds']:.2f}"
+            print(f"{name:<30} {variant:<7} {row['prompt_tokens']:>10} {completion:>10} {seconds:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Prompt tokens saved by prompt_assembly.py, per advice type.
+#
+#   python benchmarks/bench_prompt_assembly.py [--budget 1500] [--analysis-paragraphs 12]
+#
+# "before" is the prompt rendered from the pretty-printed profile and the full prior
+# analysis, "after" is what the chains actually send. Runs offline.
+import argparse
+
+from common import SAMPLE_PROFILE, SAMPLE_PROFILE_STR
+
+from chains import ADVICE_PROMPTS, prompt_profiling
+from metrics import compute_metrics, format_metrics
+from prompt_assembly import assemble_inputs, token_savings
+
+PARAGRAPH = (
+    "**Savings:** Your monthly savings of $2,380.00 give a savings rate of 38.4% of income, which is above "
+    "the 20% guideline. Keeping this up while paying down high-interest debt is the main lever you have. "
+    "Consider automating transfers on payday so the surplus does not get absorbed by discretionary spending."
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens saved per advice type")
+    parser.add_argument("--budget", type=int, default=1500, help="prompt token budget")
+    parser.add_argument("--analysis-paragraphs", type=int, default=12, help="length of the synthetic prior analysis")
+    args = parser.parse_args()
+
+    analysis = "\n\n".join(f"### Point {n + 1}\n{PARAGRAPH}" for n in range(args.analysis_paragraphs))
+    inputs = {
+        "financial_data_str": SAMPLE_PROFILE_STR,
+        "financial_metrics": format_metrics(compute_metrics(SAMPLE_PROFILE)),
+        "analyzed_response": analysis,
+    }
+
+    assemble_inputs(prompt_profiling, inputs, args.budget, "Analyze my finances")
+    for advice_type, prompt in ADVICE_PROMPTS.items():
+        assemble_inputs(prompt, inputs, args.budget, advice_type)
+
+    print(f"{'prompt':<30} {'before':>8} {'after':>8} {'saved':>8} {'condensed':>10}")
+    for row in token_savings.report():
+        print(f"{row['advice_type']:<30} {row['tokens_before']:>8} {row['tokens_after']:>8} "
+              f"{row['tokens_saved']:>8} {'yes' if row['condensed'] else 'no':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Concurrent sessions against a rate-limited model, with and without the shared LLM executor.
+#
+#   python benchmarks/bench_rate_limiter.py [--sessions 4] [--calls 10] [--limit 10] [--window 1]
+#
+# The fake model allows --limit requests per --window seconds and answers 429 above that, like
+# a provider at its rate limit. Each session makes --calls calls one after another. Reports the
+# wall time, failed calls, rate limit retries and when each session finished (fairness: with
+# fair queuing the sessions finish at about the same time).
+import argparse
+import threading
+import time
+
+import common  # noqa: F401 - makes the app modules importable
+from fake_llm import FakeStreamingChatModel
+from llm_pool import LLMExecutor, RateLimitedChatModel, current_session
+
+
+def run_sessions(llm, sessions, calls):
+    errors = []
+    finished = {}
+    start = time.perf_counter()
+
+    def session(session_id):
+        current_session.set(session_id)
+        for _ in range(calls):
+            try:
+                llm.invoke("How much should I save each month?")
+            except Exception as e:
+                errors.append(e)
+        finished[session_id] = time.perf_counter() - start
+
+    threads = [threading.Thread(target=session, args=(f"session-{n}",)) for n in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, len(errors), sorted(finished.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM executor rate limiting benchmark")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=10, help="calls per session")
+    parser.add_argument("--limit", type=int, default=10, help="requests the fake model allows per window")
+    parser.add_argument("--window", type=float, default=1.0, help="rate limit window in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake model call")
+    args = parser.parse_args()
+
+    def fresh_model():
+        return FakeStreamingChatModel(first_token_delay=args.latency, rate_limit_requests=args.limit,
+                                      rate_limit_window=args.window)
+
+    requests_per_minute = int(args.limit / args.window * 60)
+    setups = {
+        "direct": fresh_model(),
+        "executor, retries only": RateLimitedChatModel(
+            llm=fresh_model(), executor=LLMExecutor(max_concurrency=args.sessions, backoff_base=args.window / 4)),
+        "executor, rate limited": RateLimitedChatModel(
+            llm=fresh_model(), executor=LLMExecutor(max_concurrency=args.sessions, backoff_base=args.window / 4,
+                                                    requests_per_minute=requests_per_minute,
+                                                    request_burst=max(args.limit // 2, 1))),
+    }
+
+    print(f"{args.sessions} sessions x {args.calls} calls, model limit {args.limit} requests / {args.window}s")
+    print(f"{'setup':<24} {'wall s':>7} {'failed':>7} {'retries':>8}  session finish times (s)")
+    for name, llm in setups.items():
+        wall, failed, finished = run_sessions(llm, args.sessions, args.calls)
+        retries = llm.executor.stats()["retries"] if isinstance(llm, RateLimitedChatModel) else 0
+        print(f"{name:<24} {wall:>7.2f} {failed:>7} {retries:>8}  " + " ".join(f"{t:.2f}" for t in finished))
+        time.sleep(args.window)  # let the model's window clear before the next setup
+
+
+if __name__ == "__main__":
+    main()
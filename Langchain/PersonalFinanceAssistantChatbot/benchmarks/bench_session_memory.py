@@ -0,0 +1,105 @@
+# Memory per session: the old plain st.session_state layout vs the compact session store.
+#
+#   python benchmarks/bench_session_memory.py [--sessions 500] [--words 600]
+#
+# Builds --sessions sessions that each hold an analysis and all six advice answers (about
+# --words words each), the way the app leaves them after a full report, and measures the Python
+# heap they take with tracemalloc. The plain layout keeps the pretty-printed profile, the metrics,
+# the analysis, the last detailed feedback, the full report and the per-type advice results as
+# str; the compact one keeps compressed bytes only (the metrics are recomputed from the profile
+# when needed) - measured with the same content, and after one round of edits (so every advice
+# type also has one earlier version in memory).
+import argparse
+import os
+import re
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from common import SAMPLE_PROFILE
+from chains import ADVICE_TYPES, SHARED_INSTRUCTIONS, prompt_budget, prompt_health, prompt_profiling
+from financial_profile import profile_inputs
+from session_store import SessionRegistry, SpillStore
+
+
+def answer_generator(seed):
+    # Random sentences over the prompts' own vocabulary, with figures, compress about as well
+    # as real answers (plain repeated text would compress far better)
+    prompt_text = SHARED_INSTRUCTIONS + " ".join(
+        message.prompt.template for prompt in (prompt_profiling, prompt_budget, prompt_health) for message in prompt.messages)
+    vocabulary = sorted(set(re.findall(r"[A-Za-z]+", prompt_text)))
+    rng = np.random.default_rng(seed)
+
+    def answer(n_words):
+        words = [str(word) for word in rng.choice(vocabulary, n_words)]
+        for n in range(0, n_words, 12):
+            words[n] = f"${int(rng.integers(10, 20000)):,}"
+        return " ".join(words)
+
+    return answer
+
+
+def plain_session(n, answer, words):
+    inputs = profile_inputs({**SAMPLE_PROFILE, "income": SAMPLE_PROFILE["income"] + n})
+    advice = {advice_type: answer(words) for advice_type in ADVICE_TYPES}
+    return {
+        "financial_data_str": inputs["financial_data_str"],
+        "financial_metrics_str": inputs["financial_metrics"],
+        "analyzed_response": answer(words),
+        "selected_advice": ADVICE_TYPES[0],
+        "detailed_feedback": advice[ADVICE_TYPES[0]],
+        "full_report": dict(advice),
+        "advice_results": dict(advice),
+    }
+
+
+def compact_session(n, answer, words, registry, versions=1):
+    financial_data = {**SAMPLE_PROFILE, "income": SAMPLE_PROFILE["income"] + n}
+    session = registry.new_session(f"session-{n}")
+    session.financial_data = financial_data
+    session.analyzed_response = answer(words)
+    for _ in range(versions):  # the current answers plus versions - 1 earlier ones of each
+        for advice_type in ADVICE_TYPES:
+            session.set_advice(advice_type, answer(words))
+    return session
+
+
+def measure(build, count):
+    tracemalloc.start()
+    sessions = [build(n) for n in range(count)]
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return used / count, sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per session benchmark")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--words", type=int, default=600, help="words per analysis/advice answer")
+    args = parser.parse_args()
+
+    answer = answer_generator(0)
+    answer(args.words)  # build the vocabulary outside the measurement
+    plain, _ = measure(lambda n: plain_session(n, answer, args.words), args.sessions)
+
+    registry = SessionRegistry(SpillStore(os.path.join(tempfile.mkdtemp(), "sessions.sqlite")))
+    compact, _ = measure(lambda n: compact_session(n, answer, args.words, registry), args.sessions)
+    registry = SessionRegistry(SpillStore(os.path.join(tempfile.mkdtemp(), "sessions.sqlite")))
+    with_history, sessions = measure(lambda n: compact_session(n, answer, args.words, registry, versions=2), args.sessions)
+    evicted_before = registry.memory_stats()
+    for session in sessions[: len(sessions) // 2]:
+        session.evict()
+    evicted_after = registry.memory_stats()
+
+    print(f"{args.sessions} sessions, {args.words} words per answer")
+    print(f"plain session_state      {plain / 1024:8.1f} KB per session")
+    print(f"compact session store    {compact / 1024:8.1f} KB per session")
+    print(f"  with advice history    {with_history / 1024:8.1f} KB per session (one earlier version per advice type)")
+    print(f"  reported payload       {evicted_before['bytes_per_session'] / 1024:8.1f} KB per session")
+    print(f"  half evicted to disk   {evicted_after['memory_bytes'] / args.sessions / 1024:8.1f} KB per session "
+          f"({evicted_after['evicted']} sessions on disk)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Hit rate vs answer drift of the near-duplicate analysis cache on a synthetic profile set.
+#
+#   python benchmarks/bench_similarity_cache.py [--bases 50] [--variants 20] [--noise 0.05]
+#
+# Generates --bases random profiles and --variants copies of each with every amount jittered by
+# up to +-noise, and streams them through a SimilarityCache (misses are "analysed" and stored).
+# The analysis is a deterministic stand-in for chain1's answer: it quotes profile values and the
+# precomputed metrics like the model does and a rule of thumb, and for half the profiles amounts
+# the model works out itself (which re-templating can't fix, so those are never reused). Drift is
+# measured on the numbers of each cache hit against the answer a fresh analysis of that profile
+# would have given:
+#   hit rate       share of profiles answered from the cache
+#   figure drift   share of the numbers in a hit that differ from the fresh answer
+#   exact          share of hits identical to the fresh answer
+import argparse
+import copy
+
+import numpy as np
+
+from common import SAMPLE_PROFILE
+from financial_profile import DEBT_TYPES, EXPENSE_FIELDS
+from metrics import compute_metrics, format_metrics
+from similarity_cache import NUMBER, SimilarityCache
+
+
+def synthetic_analysis(financial_data):
+    expenses = financial_data["expenses"]
+    analysis = (
+        f"Your monthly income is ${financial_data['income']:,} and you spend ${expenses['housing']:,} on housing "
+        f"and ${expenses['groceries']:,} on groceries. You have ${financial_data['savings']:,} saved.\n"
+        f"{format_metrics(compute_metrics(financial_data))}\n"
+        "Experts recommend saving at least 20% of income."
+    )
+    if financial_data["misc_info"]:
+        # Derived by the "model" - not one of the profile's figures, so the cache can't reuse it
+        analysis += (f"\nAim to put ${round(financial_data['income'] * 0.2, -1):,.0f} a month towards savings and "
+                     f"cut entertainment to ${round(expenses['entertainment'] * 0.8, -1):,.0f}.")
+    return analysis
+
+
+def random_profile(rng):
+    profile = copy.deepcopy(SAMPLE_PROFILE)
+    profile["income"] = int(rng.integers(2500, 15000, endpoint=True) // 10 * 10)
+    profile["expenses"] = {field: int(rng.integers(50, 2500) // 10 * 10) for field in EXPENSE_FIELDS}
+    profile["savings"] = int(rng.integers(0, 40000) // 100 * 100)
+    profile["debts"] = [
+        {"debt_type": str(rng.choice(DEBT_TYPES)), "debt_balance": int(rng.integers(500, 40000) // 100 * 100),
+         "interest_rate": round(float(rng.uniform(3, 28)), 1)}
+        for _ in range(int(rng.integers(0, 3, endpoint=True)))
+    ]
+    # Half the analyses also recommend amounts of their own (see synthetic_analysis)
+    profile["misc_info"] = "Planning to buy a car." if rng.integers(2) else ""
+    return profile
+
+
+def jitter(profile, rng, noise):
+    def amount(value, step):
+        return int(round(value * (1 + rng.uniform(-noise, noise)) / step) * step)
+
+    variant = copy.deepcopy(profile)
+    variant["income"] = amount(profile["income"], 10)
+    variant["expenses"] = {field: amount(value, 10) for field, value in profile["expenses"].items()}
+    variant["savings"] = amount(profile["savings"], 100)
+    for debt in variant["debts"]:
+        debt["debt_balance"] = amount(debt["debt_balance"], 100)
+    return variant
+
+
+def figure_drift(answer, reference):
+    answer_figures = [match.group(0) for match in NUMBER.finditer(answer)]
+    reference_figures = [match.group(0) for match in NUMBER.finditer(reference)]
+    if len(answer_figures) != len(reference_figures):
+        return 1.0
+    return sum(a != r for a, r in zip(answer_figures, reference_figures)) / max(len(reference_figures), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Similarity cache hit rate vs drift benchmark")
+    parser.add_argument("--bases", type=int, default=50, help="distinct base profiles")
+    parser.add_argument("--variants", type=int, default=20, help="jittered copies of each base profile")
+    parser.add_argument("--noise", type=float, default=0.05, help="max relative change of each amount")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.9, 0.95, 0.97, 0.99])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    bases = [random_profile(rng) for _ in range(args.bases)]
+    profiles = [jitter(base, rng, args.noise) for base in bases for _ in range(args.variants)]
+    rng.shuffle(profiles)
+
+    print(f"{len(profiles)} profiles ({args.bases} bases x {args.variants} variants, +-{args.noise:.0%} noise)")
+    print(f"{'threshold':>9} {'hit rate':>9} {'figure drift':>13} {'exact':>7}")
+    for threshold in args.thresholds:
+        cache = SimilarityCache(threshold=threshold, maxsize=len(profiles))
+        drifts = []
+        for profile in profiles:
+            reference = synthetic_analysis(profile)
+            answer = cache.lookup(profile)
+            if answer is None:
+                cache.add(profile, reference)
+            else:
+                drifts.append(figure_drift(answer, reference))
+        hits = len(drifts)
+        drift = float(np.mean(drifts)) if drifts else 0.0
+        exact = sum(d == 0 for d in drifts) / hits if hits else 0.0
+        print(f"{threshold:>9.2f} {hits / len(profiles):>9.1%} {drift:>13.1%} {exact:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# App startup benchmark, meant to be tracked in CI.
+#
+#   python benchmarks/bench_startup.py [--reruns 20] [--json]
+#
+# Every measurement runs in a fresh interpreter so module caches don't hide import costs:
+#   import_s        importing the modules main.py imports at the top level
+#   first_render_s  first run of main.py (cold start up to a rendered form), via AppTest
+#   rerun_s         median time of a rerun after that (what every click outside the profile form costs)
+#   langchain_loaded  whether the first render pulled in LangChain at all
+# Runs offline: the app is started with USE_FAKE_LLM.
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+from common import APP_DIR
+
+MAIN = os.path.join(APP_DIR, "main.py")
+
+APP_SCRIPT = """
+import json, statistics, sys, time
+from streamlit.testing.v1 import AppTest
+
+at = AppTest.from_file({main!r}, default_timeout=120)
+at.secrets["OPENAI_API_KEY"] = "sk-benchmark"
+at.secrets["LANGCHAIN_API_KEY"] = "benchmark"
+at.secrets["USE_FAKE_LLM"] = True
+start = time.perf_counter()
+at.run()
+first_render = time.perf_counter() - start
+langchain_loaded = "langchain_core" in sys.modules
+reruns = []
+for _ in range({reruns}):
+    start = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - start)
+print(json.dumps({{"first_render_s": first_render, "rerun_s": statistics.median(reruns),
+                  "langchain_loaded": langchain_loaded}}))
+"""
+
+IMPORT_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {app_dir!r})
+import streamlit  # the harness itself, not counted
+start = time.perf_counter()
+{imports}
+print(json.dumps({{"import_s": time.perf_counter() - start}}))
+"""
+
+
+def top_level_imports():
+    """The import statements at the top level of main.py, as source lines."""
+    with open(MAIN, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def run(script):
+    result = subprocess.run([sys.executable, "-W", "ignore", "-c", script], cwd=APP_DIR,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="App startup benchmark")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print one JSON object (for CI)")
+    args = parser.parse_args()
+
+    results = run(IMPORT_SCRIPT.format(app_dir=APP_DIR, imports="\n".join(top_level_imports())))
+    results.update(run(APP_SCRIPT.format(main=MAIN, reruns=args.reruns)))
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name, value in results.items():
+        print(f"{name:<18} {value:.3f}" if isinstance(value, float) else f"{name:<18} {value}")
+
+
+if __name__ == "__main__":
+    main()
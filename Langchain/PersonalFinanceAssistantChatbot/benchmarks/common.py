@@ -0,0 +1,35 @@
+# Shared setup for the benchmark scripts: makes the app modules importable and
+# provides a realistic sample profile in the same shape main.py builds.
+import json
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+SAMPLE_PROFILE = {
+    "income": 6200,
+    "expenses": {
+        "housing": 1900,
+        "utilities": 220,
+        "groceries": 650,
+        "entertainment": 300,
+        "transportation": 400,
+        "other_expenses": 350
+    },
+    "debts": [
+        {"debt_type": "Credit Card", "debt_balance": 7400, "interest_rate": 23.9},
+        {"debt_type": "Student Loan", "debt_balance": 28000, "interest_rate": 5.8},
+        {"debt_type": "Other", "debt_balance": 2100, "interest_rate": 11.5}
+    ],
+    "savings": 5200,
+    "investments": "401(k) with about $18,000, no other investments",
+    "financial_goals": ["Building an Emergency Fund", "Paying off Debt"],
+    "risk_tolerance": "Balanced",
+    "emergency_fund": {"exists": "Yes", "months_covered": 1},
+    "time_frame": "2 years",
+    "misc_info": "Expecting a 5% raise next year."
+}
+
+SAMPLE_PROFILE_STR = json.dumps(SAMPLE_PROFILE, indent=4)
@@ -0,0 +1,277 @@
+# Response cache for the LLM calls made by the app.
+# With temperature=0 the same profile + prompt gives the same answer, so repeated
+# clicks on "Analyze my finances" / "Get Detailed Feedback" can be served from here
+# instead of paying for another gpt-4o round trip.
+#
+# The caches plug into LangChain's global LLM cache (set_llm_cache), so every
+# `prompt | llm | output_parser` chain picks them up without any changes.
+# LangChain hands us the rendered prompt messages (`prompt`) and a string describing
+# the model and its parameters, model name and temperature included (`llm_string`).
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.caches import BaseCache
+from langchain_core.callbacks.manager import dispatch_custom_event
+from langchain_core.globals import get_llm_cache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+from langchain_core.runnables import RunnableSequence
+
+# Name of the callback event sent when stream_with_cache replays a cached answer
+CACHE_HIT_EVENT = "llm_cache_hit"
+
+
+def cache_key(prompt, llm_string):
+    """Content hash of (model + parameters, rendered prompt messages)."""
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def _encode_generations(generations):
+    # Only the text is kept: the app's models are chat models, and an answer is all it reuses
+    return json.dumps([generation.text for generation in generations])
+
+
+def _decode_generations(value):
+    """The chat generations stored by _encode_generations, or None for a row in another format
+    (e.g. written by an older version), which then counts as a miss."""
+    try:
+        texts = json.loads(value)
+    except ValueError:
+        return None
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return None
+    return [ChatGeneration(message=AIMessage(content=text)) for text in texts]
+
+
+class _CounterMixin:
+    """Hit/miss counters shared by all backends, safe to update from several session threads."""
+
+    def __bool__(self):
+        # LangChain tests `if llm_cache:` - an empty cache must still count as configured
+        return True
+
+    def _reset_counters(self):
+        if not hasattr(self, "_counter_lock"):
+            self._counter_lock = threading.Lock()
+        with self._counter_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def _count(self, value):
+        with self._counter_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            return None
+        # Tag the generations so callback handlers can tell a cache hit from a model call
+        return [
+            generation.model_copy(update={"generation_info": {**(generation.generation_info or {}), "cache_hit": True}})
+            for generation in value
+        ]
+
+    def stats(self):
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "size": len(self),
+        }
+
+
+class LRUCache(_CounterMixin, BaseCache):
+    """In-process cache with a size cap (least recently used entry goes first)
+    and an optional time-to-live in seconds."""
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, generations)
+        self._lock = threading.Lock()
+        self._reset_counters()
+
+    def __len__(self):
+        return len(self._data)
+
+    def lookup(self, prompt, llm_string):
+        key = cache_key(prompt, llm_string)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.time():
+                # Expired - drop it and treat as a miss
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+            return self._count(entry[1] if entry is not None else None)
+
+    def update(self, prompt, llm_string, return_val):
+        key = cache_key(prompt, llm_string)
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, return_val)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._data.clear()
+            self._reset_counters()
+
+
+class SQLiteCache(_CounterMixin, BaseCache):
+    """On-disk cache that survives Streamlit restarts, with an optional
+    time-to-live in seconds. Expired entries are dropped when looked up, and
+    all of them at startup and every `evict_every` writes, so entries that are
+    never asked for again don't stay on disk forever."""
+
+    def __init__(self, path=".cache/responses.sqlite", ttl=None, evict_every=100):
+        self.path = path
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Streamlit serves sessions from several threads, so one shared
+        # connection guarded by a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        self._reset_counters()
+        self.evict_expired()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def lookup(self, prompt, llm_string):
+        key = cache_key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl and row[1] + self.ttl < time.time():
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+        return self._count(_decode_generations(row[0]) if row is not None else None)
+
+    def update(self, prompt, llm_string, return_val):
+        key = cache_key(prompt, llm_string)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                (key, _encode_generations(return_val), time.time()),
+            )
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self.evict_expired()
+
+    def evict_expired(self):
+        """Delete every entry older than the TTL. Returns the number removed."""
+        if not self.ttl:
+            return 0
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            return cur.rowcount
+
+    def clear(self, **kwargs):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+        self._reset_counters()
+
+
+class TieredCache(_CounterMixin, BaseCache):
+    """LRU in front of SQLite: hot entries are served from memory, everything
+    else from disk (and promoted to memory on a hit)."""
+
+    def __init__(self, memory, disk):
+        self.memory = memory
+        self.disk = disk
+        self._reset_counters()
+
+    def __len__(self):
+        return len(self.disk)
+
+    def lookup(self, prompt, llm_string):
+        value = self.memory.lookup(prompt, llm_string)
+        if value is None:
+            value = self.disk.lookup(prompt, llm_string)
+            if value is not None:
+                self.memory.update(prompt, llm_string, value)
+        return self._count(value)
+
+    def update(self, prompt, llm_string, return_val):
+        self.memory.update(prompt, llm_string, return_val)
+        self.disk.update(prompt, llm_string, return_val)
+
+    def clear(self, **kwargs):
+        self.memory.clear()
+        self.disk.clear()
+        self._reset_counters()
+
+
+def make_cache(backend="tiered", maxsize=256, ttl=None, path=".cache/responses.sqlite"):
+    """Build a cache from config. backend is one of "memory", "sqlite", "tiered" or "none"."""
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteCache(path=path, ttl=ttl)
+    if backend == "tiered":
+        return TieredCache(LRUCache(maxsize=maxsize, ttl=ttl), SQLiteCache(path=path, ttl=ttl))
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+def stream_with_cache(chain, inputs, config=None):
+    """Stream the text of a `... | prompt | llm | output_parser` chain.
+
+    LangChain only consults the LLM cache on invoke(), so streaming would always go to
+    the model. Here a cached answer is replayed in one piece, and a freshly streamed
+    answer is stored once it is complete, under the same key invoke() would use.
+    Run it inside a runnable (e.g. RunnableLambda) to have `config` and callbacks passed in.
+    """
+    steps = chain.steps
+    llm_index = next((i for i, step in enumerate(steps) if isinstance(step, BaseChatModel)), None)
+    llm_cache = get_llm_cache()
+    if llm_cache is None or llm_index is None or steps[llm_index].cache is False:
+        yield from chain.stream(inputs, config)
+        return
+
+    # Run everything up to the model (input assembly, prompt template) to get the messages
+    prompt_value = inputs
+    for step in steps[:llm_index]:
+        prompt_value = step.invoke(prompt_value, config)
+    prompt_str = dumps(prompt_value.to_messages())
+    llm_string = steps[llm_index]._get_llm_string()
+    cached = llm_cache.lookup(prompt_str, llm_string)
+    if cached:
+        if config is not None:
+            dispatch_custom_event(CACHE_HIT_EVENT, {"llm_string": llm_string}, config=config)
+        yield cached[0].text
+        return
+
+    chunks = []
+    for chunk in RunnableSequence(*steps[llm_index:]).stream(prompt_value, config):
+        chunks.append(chunk)
+        yield chunk
+    llm_cache.update(prompt_str, llm_string, [ChatGeneration(message=AIMessage(content="".join(chunks)))])
@@ -0,0 +1,263 @@
+# Prompt templates and chains used by the app.
+# Templates are parsed once at import time and the chains are built once per LLM,
+# so nothing here is rebuilt on a Streamlit rerun or a button click.
+# To add a new advice type, write its prompt and register it in ADVICE_PROMPTS.
+from functools import partial
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda, RunnableParallel
+
+from cache import stream_with_cache
+from prompt_assembly import prompt_assembler
+
+
+# Instructions every prompt shares. They are written once here and sent first, as their own
+# system message, so every prompt starts with the same text
+SHARED_INSTRUCTIONS = (
+    "You are a financial advisor. "
+    "Precomputed figures are provided with the profile. They are exact: quote them as given and do not recalculate them."
+    "\n\n### Formatting Guidelines:"
+    "\n- Use proper spacing between numbers and words."
+    "\n- Do not use `_` for emphasis as it can cause unwanted italicization."
+    "\n- No unwanted italicization required."
+)
+
+# Profile, precomputed figures and prior analysis, as every advice prompt receives them
+ADVICE_CONTEXT = (
+    "### User's Financial Profile\n"
+    "```\n{financial_data_str}\n```\n\n"
+    "### Precomputed Figures\n"
+    "```\n{financial_metrics}\n```\n\n"
+    "### Previous Analysis\n"
+    "```\n{analyzed_response}\n```\n\n"
+    "Follow the formatting guidelines strictly."
+)
+
+# Create the profiling prompt template
+prompt_profiling = ChatPromptTemplate.from_messages([
+    ("system", SHARED_INSTRUCTIONS),
+    ("system",
+     "Your task is to analyze the user's financial profile based strictly on the provided data. "
+     "Do not make assumptions, generate additional numbers, or modify values. If a value is missing, explicitly state that instead of estimating it. "
+     "The financial data is provided in a structured JSON format. Parse it properly and ensure all calculations strictly use these values."
+     "\n\nAfter summarizing the user's financial profile, provide insights on:"
+     "- Whether their expenses are too high in comparison to their income."
+     "- If they are saving enough based on standard recommendations (e.g., 20 percent of income should go toward savings)."
+     "- Whether they are managing debt responsibly, including debt-to-income ratio considerations."
+     "- Suggestions for improvements based on their goals and financial health."
+    ),
+    ("user", 
+     "Here is the user's financial profile in JSON format:\n```json\n{financial_data_str}\n```\n"
+     "Precomputed figures for this profile:\n```\n{financial_metrics}\n```\n"
+     "Summarize this data exactly as provided, then analyze it based on the criteria mentioned above. "
+     "Follow the formatting guidelines strictly."
+    )
+])
+
+# ------------------------------------------------------------------------------------------
+# Prompt templates for the detailed advice options
+
+# Budget Breakdown
+prompt_budget = ChatPromptTemplate.from_messages([
+    ("system", SHARED_INSTRUCTIONS),
+    ("system",
+        "The user seeks help managing their budget. "
+        "Keep the language simple, provide personalized numbers, and ensure the response follows a structured breakdown.\n\n"
+        "### Budget Breakdown Must Include:\n"
+        "- **Expense Categorization:** Classify expenses into **Fixed (e.g., rent, utilities)** and **Variable (e.g., food, entertainment).**\n"
+        "- **Expense Prioritization:** Rank each expense as **High, Medium, or Low Priority** and suggest reductions for non-essentials.\n"
+        "- **Expense Percentage Analysis:** Use the precomputed **percentage of total income** each category consumes.\n"
+        "- **Savings Evaluation:** Assess if savings align with financial guidelines (**20% of income**).\n"
+        "- **Emergency Fund Check:** Determine if the user has **at least 3-6 months of expenses saved** and suggest adjustments if needed.\n"
+        "- **Custom Budgeting Strategy Based on Financial Goals:**\n"
+        "   - If goal is **debt repayment**, suggest an aggressive pay-off strategy.\n"
+        "   - If goal is **home purchase**, recommend high-interest savings accounts.\n"
+        "   - If goal is **retirement savings**, suggest tax-advantaged investment options.\n"
+        "- **Actionable Steps:** Provide a clear plan on how to improve budgeting habits and optimize financial stability.\n"
+    ),
+    ("user",
+        "Using the following financial profile and prior analysis, create a structured and actionable budget breakdown:\n\n"
+        + ADVICE_CONTEXT
+    )
+])
+
+# Debt Repayment Strategy
+prompt_debt = ChatPromptTemplate.from_messages([
+    ("system", SHARED_INSTRUCTIONS),
+    ("system",
+        "The user is seeking advice on paying off their debt. "
+        "Keep the language simple and provide a structured, step-by-step debt repayment plan. "
+        "Ensure that numbers are personalized based on their financial data.\n\n"
+        "### Debt Repayment Strategy Must Include:\n"
+        "- **Debt Categorization:** Identify all debt types and list their balances & interest rates.\n"
+        "- **Optimal Payoff Method:** Suggest whether they should use the **Avalanche (high-interest first)** or **Snowball (smallest first)** method.\n"
+        "- **Monthly Payment Breakdown:** Recommend how much they should allocate towards debt each month.\n"
+        "- **Debt-Free Timeline:** Use the precomputed Avalanche and Snowball timelines to say when they will be debt-free.\n"
+        "- **Impact on Credit Score:** Briefly explain how different strategies affect credit standing.\n"
+        "- **Alternative Options:** If applicable, suggest **loan consolidation, refinancing, or balance transfers**.\n"
+    ),
+    ("user",
+        "Using the following financial profile and previous analysis, create a comprehensive debt repayment plan:\n\n"
+        + ADVICE_CONTEXT
+    )
+])
+
+# Savings Milestone Suggestion
+prompt_savings = ChatPromptTemplate.from_messages([
+    ("system", SHARED_INSTRUCTIONS),
+    ("system",
+        "The user seeks guidance on setting savings milestones. "
+        "Use clear, realistic targets and ensure numbers are personalized.\n\n"
+        "### Savings Plan Must Include:\n"
+        "- **Short-Term Goals (6-12 months):** Emergency fund, vacation, short-term needs.\n"
+        "- **Mid-Term Goals (1-5 years):** Home purchase, major purchases, tuition.\n"
+        "- **Long-Term Goals (5+ years):** Retirement, financial independence, investments.\n"
+        "- **Savings Target Calculation:** Recommend how much to save each month to meet these goals.\n"
+        "- **Best Savings Methods:** Compare **high-yield savings, CDs, Roth IRAs, 401(k), and investments**.\n"
+        "- **Automated Savings Strategy:** Suggest tools like auto-deposits, budgeting apps, and employer-match contributions.\n"
+    ),
+    ("user",
+        "Based on the user's financial data and goals, create a structured savings milestone plan:\n\n"
+        + ADVICE_CONTEXT
+    )
+])
+
+# Investment Advice
+prompt_investment = ChatPromptTemplate.from_messages([
+    ("system", SHARED_INSTRUCTIONS),
+    ("system",
+        "The user is seeking investment guidance based on their financial profile. "
+        "Ensure investment suggestions align with their **risk tolerance, financial goals, and current savings.**\n\n"
+        "### Investment Strategy Must Include:\n"
+        "- **Investment Readiness Check:** Determine if the user has sufficient savings before investing.\n"
+        "- **Risk-Based Investment Suggestions:** Conservative (bonds, CDs), Balanced (index funds, ETFs), Aggressive (stocks, crypto).\n"
+        "- **Diversification Plan:** Recommend allocation percentages across different asset classes.\n"
+        "- **Retirement Planning:** Suggest **401(k), Roth IRA, and HSA accounts.**\n"
+        "- **Tax-Advantaged Investments:** Explain tax benefits of certain investments.\n"
+    ),
+    ("user",
+        "Using the following financial profile and risk tolerance, create a personalized investment plan:\n\n"
+        + ADVICE_CONTEXT
+    )
+])
+
+# Emergency Fund Calculation
+prompt_emergency = ChatPromptTemplate.from_messages([
+    ("system", SHARED_INSTRUCTIONS),
+    ("system",
+        "The user is seeking emergency fund guidance. "
+        "Ensure your calculations are **based on their expenses and current savings.**\n\n"
+        "### Emergency Fund Plan Must Include:\n"
+        "- **Months of Expenses Covered:** State how many months the emergency fund lasts, as the user entered it in the profile "
+        "(months_covered); if they have no emergency fund, say how many months their total savings would cover, using the precomputed figure.\n"
+        "- **Standard Benchmark:** Compare against the **recommended 3-6 month savings rule.**\n"
+        "- **Monthly Contribution Suggestion:** Estimate how much to save monthly to meet the goal.\n"
+        "- **Best Account Type:** Suggest storing the fund in **high-yield savings, money market, or liquid assets.**\n"
+    ),
+    ("user",
+        "Based on their expenses and savings, calculate how much they should save for an emergency fund:\n\n"
+        + ADVICE_CONTEXT
+    )
+])
+
+# Financial Health Report
+prompt_health = ChatPromptTemplate.from_messages([
+    ("system", SHARED_INSTRUCTIONS),
+    ("system",
+        "The user is seeking a comprehensive financial health assessment. "
+        "Provide a structured report based on their financial data.\n\n"
+        "### Financial Health Report Must Include:\n"
+        "- **Overall Financial Score (1-10):** Assign a score based on their income, expenses, savings, and debt levels.\n"
+        "- **Debt-to-Income (DTI) Ratio Analysis:** Use the precomputed DTI ratio and assess if it's in a healthy range.\n"
+        "- **Savings Rate Evaluation:** Compare the user's savings rate to financial guidelines (e.g., saving at least 20% of income).\n"
+        "- **Expense Optimization:** Identify high spending categories and suggest reductions for discretionary expenses.\n"
+        "- **Emergency Fund Status:** Check if they have 3-6 months of expenses saved and recommend adjustments if needed.\n"
+        "- **Retirement Readiness:** Determine if they are contributing adequately to retirement plans (401k, Roth IRA, etc.).\n"
+        "- **Investment Readiness:** Assess if they have a strong financial foundation for investing and suggest asset allocation.\n"
+        "- **Personalized Recommendations:** Provide a **step-by-step action plan** to improve financial health.\n"
+    ),
+    ("user",
+        "Using the following financial profile and prior analysis, create a structured financial health report:\n\n"
+        + ADVICE_CONTEXT
+    )
+])
+
+# ------------------------------------------------------------------------------------------
+# Follow-up chat over the analysis. Messages are ordered from most to least stable - shared
+# instructions, the profile context (fixed for the whole conversation), the conversation
+# summary (changes only when older turns are folded into it), the recent turns (append-only)
+# and the question - so consecutive turns share a long common prefix that provider-side
+# prompt caching can reuse. See chat_memory.py for how the summary and recent turns are kept
+prompt_followup = ChatPromptTemplate.from_messages([
+    ("system", SHARED_INSTRUCTIONS),
+    ("system",
+        "The user has read your analysis of their finances and is asking follow-up questions. "
+        "Answer the question directly and briefly, with personalized numbers from their profile and the precomputed figures. "
+        "If a question needs information that is not in the profile, say what is missing."
+    ),
+    ("user", ADVICE_CONTEXT),
+    ("system", "Summary of the earlier conversation:\n{conversation_summary}"),
+    MessagesPlaceholder("recent_turns"),
+    ("user", "{question}"),
+])
+
+# Folds older chat turns into the running conversation summary
+prompt_summarize = ChatPromptTemplate.from_messages([
+    ("system",
+        "You keep a running summary of a conversation between a user and their financial advisor. "
+        "Merge the new exchanges into the current summary. Keep every figure, decision and open question; "
+        "drop greetings and repetition. Write at most {max_words} words."
+    ),
+    ("user", "Current summary:\n{conversation_summary}\n\nNew exchanges:\n{new_turns}"),
+])
+
+# Advice type -> prompt template. Every advice prompt takes the same inputs
+# (financial_data_str, financial_metrics, analyzed_response); the order here is the order shown in the app
+ADVICE_PROMPTS = {
+    "Budget Breakdown": prompt_budget,
+    "Debt Repayment Strategy": prompt_debt,
+    "Savings Milestone Suggestion": prompt_savings,
+    "Investment Advice": prompt_investment,
+    "Emergency Fund Calculation": prompt_emergency,
+    "Financial Health Report": prompt_health,
+}
+ADVICE_TYPES = tuple(ADVICE_PROMPTS)
+
+
+def build_profiling_chain(llm, token_budget=None):
+    """chain1: financial profile -> analysis."""
+    return (prompt_assembler(prompt_profiling, token_budget, "Analyze my finances")
+            | prompt_profiling | llm | StrOutputParser())
+
+
+def build_advice_chains(llm, token_budget=None, advice_llms=None):
+    """Dispatch table of advice type -> `assembler | prompt | llm | output_parser` chain.
+    Prompts over token_budget get a condensed version of the prior analysis.
+    `advice_llms` maps advice types to another model than `llm` (see model_router.py)."""
+    advice_llms = advice_llms or {}
+    return {
+        advice_type: (prompt_assembler(prompt, token_budget, advice_type) | prompt
+                      | advice_llms.get(advice_type, llm) | StrOutputParser())
+        for advice_type, prompt in ADVICE_PROMPTS.items()
+    }
+
+
+def build_full_report_chain(advice_chains):
+    """All advice chains dispatched concurrently. Each branch streams through the
+    response cache, and RunnableParallel hands back chunks from whichever branch
+    produces one first."""
+    return RunnableParallel({
+        advice_type: RunnableLambda(partial(stream_with_cache, chain)).with_config(metadata={"advice_type": advice_type})
+        for advice_type, chain in advice_chains.items()
+    })
+
+
+def build_followup_chain(llm):
+    """Follow-up question (+ profile context and chat memory) -> answer."""
+    return prompt_followup | llm | StrOutputParser()
+
+
+def build_summary_chain(llm):
+    """(summary so far, turns to fold in) -> updated conversation summary."""
+    return prompt_summarize | llm | StrOutputParser()
@@ -0,0 +1,74 @@
+# Memory of a follow-up chat, kept to a fixed size.
+# Sending the whole conversation with every question makes each turn slower than the last.
+# Instead the prompt gets:
+#   - the profile context, built once per conversation (compact profile, precomputed figures,
+#     the analysis) and identical on every turn,
+#   - a running summary of the older turns,
+#   - the recent turns verbatim, up to `max_recent_tokens`.
+# When the recent turns go over the cap, the oldest of them are folded into the summary in one
+# go (down to half the cap), so the summary - and with it the prompt prefix - only changes every
+# few turns. The memory is plain strings, so it can be kept in the compact session store.
+import json
+
+from prompt_assembly import compact_profile_str
+from tokens import count_tokens
+
+NO_SUMMARY = "(nothing yet)"
+
+
+def chat_context(financial_data_str, financial_metrics, analyzed_response):
+    """The fixed part of every follow-up prompt."""
+    return {
+        "financial_data_str": compact_profile_str(financial_data_str),
+        "financial_metrics": financial_metrics,
+        "analyzed_response": analyzed_response,
+    }
+
+
+class ChatMemory:
+    def __init__(self, max_recent_tokens=1000, summary_words=150, summary="", recent=None):
+        self.max_recent_tokens = max_recent_tokens
+        self.summary_words = summary_words
+        self.summary = summary
+        self.recent = [tuple(turn) for turn in recent or []]  # (role, text), oldest first
+
+    def prompt_inputs(self, question, context):
+        """Inputs of the follow-up chain (chains.prompt_followup) for `question`."""
+        return {
+            **context,
+            "conversation_summary": self.summary or NO_SUMMARY,
+            "recent_turns": list(self.recent),
+            "question": question,
+        }
+
+    def add_turn(self, question, answer):
+        self.recent += [("human", question), ("ai", answer)]
+
+    def recent_tokens(self):
+        return sum(count_tokens(text) for _, text in self.recent)
+
+    def needs_folding(self):
+        return self.recent_tokens() > self.max_recent_tokens
+
+    def fold(self, summary_chain, config=None):
+        """Fold the oldest recent turns into the summary, leaving at most half the cap."""
+        folded = []
+        while self.recent and self.recent_tokens() > self.max_recent_tokens // 2:
+            folded += self.recent[:2]  # a question and its answer
+            self.recent = self.recent[2:]
+        if not folded:
+            return
+        new_turns = "\n".join(f"{'User' if role == 'human' else 'Advisor'}: {text}" for role, text in folded)
+        self.summary = summary_chain.invoke({
+            "conversation_summary": self.summary or NO_SUMMARY,
+            "new_turns": new_turns,
+            "max_words": self.summary_words,
+        }, config)
+
+    def to_json(self):
+        return json.dumps({"summary": self.summary, "recent": self.recent})
+
+    @classmethod
+    def from_json(cls, data, **options):
+        state = json.loads(data) if data else {}
+        return cls(summary=state.get("summary", ""), recent=state.get("recent"), **options)
@@ -0,0 +1,120 @@
+# Deterministic stand-in for ChatOpenAI so the app and its pipelines can be run offline.
+# Replies are taken from `responses` in turn and streamed word by word, with optional
+# delays to mimic a real model's time-to-first-token (optionally growing with the prompt
+# length) and token rate, and an optional
+# request limit that answers with 429 errors like a rate-limited provider.
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from tokens import count_message_tokens
+
+
+@lru_cache(maxsize=16)
+def filler_text(n_words):
+    """Deterministic text of `n_words` words, for replies of a realistic length."""
+    words = ("Your", "budget", "leaves", "$1,250", "a", "month", "after", "expenses,", "so", "put",
+             "20%", "towards", "savings", "and", "the", "rest", "towards", "debt.")
+    return " ".join(words[n % len(words)] for n in range(n_words))
+
+
+class FakeRateLimitError(Exception):
+    """What the fake model raises over its request limit (shaped like openai.RateLimitError)."""
+
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limit reached, retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Fake chat model that supports invoke, stream and their async variants."""
+
+    responses: List[str] = ["This is a fake response from the offline model."]
+    response_words: Optional[int] = None  # if set, reply with this many filler words instead of `responses`
+    model_name: str = "fake-streaming"
+    first_token_delay: float = 0.0  # seconds before the first token
+    prompt_token_delay: float = 0.0  # extra seconds before the first token, per prompt token
+    token_delay: float = 0.0  # seconds between tokens
+    rate_limit_requests: Optional[int] = None  # requests allowed per rate_limit_window, None = no limit
+    rate_limit_window: float = 60.0  # seconds
+    _index: int = PrivateAttr(default=0)  # kept out of the model params so it doesn't change cache keys
+    _request_times: deque = PrivateAttr(default_factory=deque)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self):
+        return "fake-streaming-chat-model"
+
+    def _check_rate_limit(self):
+        if self.rate_limit_requests is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            while self._request_times and now - self._request_times[0] >= self.rate_limit_window:
+                self._request_times.popleft()
+            if len(self._request_times) >= self.rate_limit_requests:
+                raise FakeRateLimitError(self._request_times[0] + self.rate_limit_window - now)
+            self._request_times.append(now)
+
+    def _next_response(self):
+        self._check_rate_limit()
+        if self.response_words:
+            return filler_text(self.response_words)
+        response = self.responses[self._index % len(self.responses)]
+        self._index += 1
+        return response
+
+    def _first_token_delay(self, messages):
+        if not self.prompt_token_delay:
+            return self.first_token_delay
+        return self.first_token_delay + self.prompt_token_delay * count_message_tokens(messages)
+
+    @staticmethod
+    def _tokens(text):
+        # Split into words while keeping the whitespace, so joining the tokens gives back the text
+        return re.findall(r"\s*\S+\s*", text) or [text]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self._next_response()
+        time.sleep(self._first_token_delay(messages) + self.token_delay * max(len(self._tokens(text)) - 1, 0))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self._next_response()
+        await asyncio.sleep(self._first_token_delay(messages) + self.token_delay * max(len(self._tokens(text)) - 1, 0))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        time.sleep(self._first_token_delay(messages))
+        for n, token in enumerate(self._tokens(self._next_response())):
+            if n and self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self._first_token_delay(messages))
+        for n, token in enumerate(self._tokens(self._next_response())):
+            if n and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name}
@@ -0,0 +1,128 @@
+# The financial profile the app collects, independent of Streamlit.
+# main.py builds it from the form widgets and batch_cli.py from JSONL/CSV records; both
+# then turn it into the same prompt inputs for chain1 and the advice chains.
+import json
+
+from metrics import compute_metrics, format_metrics
+
+EXPENSE_FIELDS = ("housing", "utilities", "groceries", "entertainment", "transportation", "other_expenses")
+DEBT_TYPES = ("Credit Card", "Student Loan", "Mortgage", "Other")
+FINANCIAL_GOALS = ("Building an Emergency Fund", "Saving for Retirement", "Paying off Debt",
+                   "Investing for the Future", "Other")
+RISK_TOLERANCES = ("Conservative", "Balanced", "Aggressive")
+TIME_FRAMES = ("6 months", "1 year", "2 years", "5 years")
+
+# The financial_data fields each advice type depends on. When the profile is edited and
+# analyzed again, advice whose fields didn't change is reused instead of regenerated.
+# Every advice prompt gets the precomputed figures, so every advice type depends on the fields
+# metrics.compute_metrics reads; misc_info is free text that can say anything, so it's in all of them too
+METRICS_FIELDS = frozenset({"income", "expenses", "savings", "debts"})
+ADVICE_DEPENDENCIES = {
+    advice_type: METRICS_FIELDS | fields | {"misc_info"}
+    for advice_type, fields in {
+        "Budget Breakdown": {"emergency_fund", "financial_goals"},
+        "Debt Repayment Strategy": set(),
+        "Savings Milestone Suggestion": {"investments", "emergency_fund", "financial_goals", "time_frame"},
+        "Investment Advice": {"investments", "financial_goals", "risk_tolerance", "time_frame"},
+        "Emergency Fund Calculation": {"emergency_fund"},
+        "Financial Health Report": {"investments", "financial_goals", "risk_tolerance", "emergency_fund", "time_frame"},
+    }.items()
+}
+
+
+def make_financial_data(income=0, expenses=None, debts=None, savings=0, investments="", financial_goals=None,
+                        risk_tolerance="Conservative", emergency_fund="No", months_covered=None,
+                        time_frame="6 months", misc_info=""):
+    """The financial_data dict passed (serialized) to the prompt templates."""
+    expenses = expenses or {}
+    return {
+        "income": income,
+        "expenses": {field: expenses.get(field, 0) for field in EXPENSE_FIELDS},
+        "debts": [
+            {
+                "debt_type": debt.get("debt_type", "Other"),
+                "debt_balance": debt.get("debt_balance", 0),
+                "interest_rate": debt.get("interest_rate", 0.0),
+            }
+            for debt in debts or []
+        ],
+        "savings": savings,
+        "investments": investments,
+        "financial_goals": list(financial_goals or []),
+        "risk_tolerance": risk_tolerance,
+        "emergency_fund": {
+            "exists": emergency_fund,
+            "months_covered": months_covered if emergency_fund == "Yes" else None
+        },
+        "time_frame": time_frame,
+        "misc_info": misc_info
+    }
+
+
+def profile_from_record(record):
+    """financial_data from one input record.
+
+    Accepts either the nested financial_data shape (as written by main.py) or a flat CSV
+    row: one column per expense, `debts` as a JSON list, `financial_goals` separated by ";",
+    `emergency_fund` Yes/No and `months_covered`.
+    """
+    if isinstance(record.get("expenses"), dict):
+        emergency = record.get("emergency_fund") or {}
+        return make_financial_data(
+            income=record.get("income", 0),
+            expenses=record["expenses"],
+            debts=record.get("debts"),
+            savings=record.get("savings", 0),
+            investments=record.get("investments", ""),
+            financial_goals=record.get("financial_goals"),
+            risk_tolerance=record.get("risk_tolerance", "Conservative"),
+            emergency_fund=emergency.get("exists", "No"),
+            months_covered=emergency.get("months_covered"),
+            time_frame=record.get("time_frame", "6 months"),
+            misc_info=record.get("misc_info", ""),
+        )
+
+    def number(value, cast=float):
+        return cast(value) if value not in (None, "") else 0
+
+    debts = record.get("debts") or []
+    if isinstance(debts, str):
+        debts = json.loads(debts) if debts.strip() else []
+    goals = record.get("financial_goals") or []
+    if isinstance(goals, str):
+        goals = [goal.strip() for goal in goals.split(";") if goal.strip()]
+    return make_financial_data(
+        income=number(record.get("income")),
+        expenses={field: number(record.get(field)) for field in EXPENSE_FIELDS},
+        debts=debts,
+        savings=number(record.get("savings")),
+        investments=record.get("investments") or "",
+        financial_goals=goals,
+        risk_tolerance=record.get("risk_tolerance") or "Conservative",
+        emergency_fund=record.get("emergency_fund") or "No",
+        months_covered=number(record.get("months_covered"), lambda value: int(float(value))),  # "3.0" from a spreadsheet
+        time_frame=record.get("time_frame") or "6 months",
+        misc_info=record.get("misc_info") or "",
+    )
+
+
+def changed_fields(old, new):
+    """Top-level financial_data fields whose values differ between two profiles."""
+    return {field for field in old.keys() | new.keys() if old.get(field) != new.get(field)}
+
+
+def invalidated_advice(changed, advice_types):
+    """The advice types (out of `advice_types`) that a change to the `changed` fields makes stale.
+    Advice types without a dependency entry are always stale."""
+    return {
+        advice_type for advice_type in advice_types
+        if advice_type not in ADVICE_DEPENDENCIES or ADVICE_DEPENDENCIES[advice_type] & changed
+    }
+
+
+def profile_inputs(financial_data):
+    """Prompt inputs shared by chain1 and the advice chains."""
+    return {
+        "financial_data_str": json.dumps(financial_data, indent=4),
+        "financial_metrics": format_metrics(compute_metrics(financial_data)),
+    }
@@ -0,0 +1,200 @@
+# Local, offline instrumentation of every LLM call made by the chains.
+# A LangChain callback handler records wall time, time to first token, prompt/completion
+# tokens, cache hits and errors per advice type into an in-memory ring buffer, which can be
+# exported as JSONL or as Prometheus-style text (optionally served over HTTP).
+#
+# Calls are attributed to an advice type through the run metadata, so pass
+# `llm_call_config(advice_type)` as the config when invoking a chain.
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from cache import CACHE_HIT_EVENT
+from tokens import count_message_tokens, count_tokens
+
+
+class InstrumentationHandler(BaseCallbackHandler):
+    """Turns chat model callbacks into one record per LLM call."""
+
+    def __init__(self, call_log):
+        self.call_log = call_log
+        self._pending = {}  # run_id -> record being filled in
+        self._lock = threading.Lock()
+
+    def _new_record(self, metadata):
+        return {
+            "timestamp": time.time(),
+            "advice_type": (metadata or {}).get("advice_type", "unknown"),
+            "wall_s": 0.0,
+            "ttft_s": None,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cache_hit": False,
+            "error": None,
+        }
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        record = self._new_record(metadata)
+        record["prompt_tokens"] = count_message_tokens(messages[0])
+        record["_start"] = time.perf_counter()
+        with self._lock:
+            self._pending[run_id] = record
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            record = self._pending.get(run_id)
+            if record is not None and record["ttft_s"] is None:
+                record["ttft_s"] = time.perf_counter() - record["_start"]
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            record = self._pending.pop(run_id, None)
+        if record is None:
+            return
+        record["wall_s"] = time.perf_counter() - record.pop("_start")
+        generation = response.generations[0][0]
+        if (generation.generation_info or {}).get("cache_hit"):
+            # Served from the response cache - nothing was sent to the provider
+            record.update(cache_hit=True, prompt_tokens=0, completion_tokens=0)
+        else:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            token_usage = (response.llm_output or {}).get("token_usage")
+            if usage:
+                record["prompt_tokens"], record["completion_tokens"] = usage["input_tokens"], usage["output_tokens"]
+            elif token_usage:
+                record["prompt_tokens"] = token_usage.get("prompt_tokens", record["prompt_tokens"])
+                record["completion_tokens"] = token_usage.get("completion_tokens", 0)
+            else:
+                # No usage reported (e.g. streaming): count the tokens ourselves
+                record["completion_tokens"] = count_tokens(generation.text)
+        if record["ttft_s"] is None:
+            record["ttft_s"] = record["wall_s"]
+        self.call_log.add(record)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            record = self._pending.pop(run_id, None)
+        if record is None:
+            return
+        record["wall_s"] = time.perf_counter() - record.pop("_start")
+        record["error"] = repr(error)
+        self.call_log.add(record)
+
+    def on_custom_event(self, name, data, *, run_id, metadata=None, **kwargs):
+        # Streaming answers replayed from the response cache never reach the chat model
+        if name == CACHE_HIT_EVENT:
+            record = self._new_record(metadata)
+            record.update(cache_hit=True, ttft_s=0.0)
+            self.call_log.add(record)
+
+
+class CallLog:
+    """Ring buffer of the most recent LLM call records plus running totals per advice type."""
+
+    def __init__(self, maxlen=1000):
+        self.records = deque(maxlen=maxlen)
+        self._totals = {}
+        self._lock = threading.Lock()
+        self.handler = InstrumentationHandler(self)
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+            totals = self._totals.setdefault(record["advice_type"], {
+                "calls": 0, "errors": 0, "cache_hits": 0, "wall_s": 0.0, "ttft_s": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0,
+            })
+            totals["calls"] += 1
+            totals["errors"] += record["error"] is not None
+            totals["cache_hits"] += record["cache_hit"]
+            totals["wall_s"] += record["wall_s"]
+            totals["ttft_s"] += record["ttft_s"] or 0.0
+            totals["prompt_tokens"] += record["prompt_tokens"]
+            totals["completion_tokens"] += record["completion_tokens"]
+
+    def recent(self):
+        with self._lock:
+            return list(self.records)
+
+    def summary(self):
+        """One row per advice type, with averages over all calls since startup."""
+        with self._lock:
+            return [
+                {
+                    "advice_type": advice_type,
+                    **totals,
+                    "avg_wall_s": totals["wall_s"] / totals["calls"],
+                    "avg_ttft_s": totals["ttft_s"] / totals["calls"],
+                }
+                for advice_type, totals in self._totals.items()
+            ]
+
+    def to_jsonl(self):
+        return "".join(json.dumps(record) + "\n" for record in self.recent())
+
+    def export_jsonl(self, path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_jsonl())
+
+    def prometheus_text(self):
+        metrics = (
+            ("calls", "finance_llm_calls_total", "LLM calls"),
+            ("errors", "finance_llm_errors_total", "LLM calls that raised an error"),
+            ("cache_hits", "finance_llm_cache_hits_total", "LLM calls answered from the response cache"),
+            ("wall_s", "finance_llm_wall_seconds_total", "Total wall time of LLM calls"),
+            ("ttft_s", "finance_llm_ttft_seconds_total", "Total time to first token"),
+            ("prompt_tokens", "finance_llm_prompt_tokens_total", "Prompt tokens sent"),
+            ("completion_tokens", "finance_llm_completion_tokens_total", "Completion tokens received"),
+        )
+        rows = self.summary()
+        lines = []
+        for key, name, help_text in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for row in rows:
+                lines.append(f'{name}{{advice_type="{row["advice_type"]}"}} {row[key]}')
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+            self._totals.clear()
+
+
+call_log = CallLog()
+
+
+def llm_call_config(advice_type=None):
+    """Runnable config that records the calls of one chain invocation under `advice_type`
+    (leave it out when the chain sets advice_type metadata itself, like the full report)."""
+    config = {"callbacks": [call_log.handler]}
+    if advice_type:
+        config["metadata"] = {"advice_type": advice_type}
+    return config
+
+
+def serve_metrics(port, log=call_log):
+    """Serve `log` as Prometheus text on http://0.0.0.0:<port>/metrics from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = log.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,323 @@
+# Process-wide executor that every LLM call goes through, shared by all Streamlit sessions.
+#
+# Calls run as coroutines on one background event loop, so the model's async HTTP client (and
+# its connection pool) is reused by every session, and waiting calls don't hold a thread each.
+# Before a call is sent it has to be admitted:
+#   - at most `max_concurrency` calls are in flight,
+#   - token buckets keep the request and token rates under requests_per_minute/tokens_per_minute,
+#   - waiting calls are admitted round-robin across sessions, so one session generating a full
+#     report doesn't starve everybody else.
+# Rate limit errors (429) are retried with jittered exponential backoff, and pause admission for
+# everyone until the backoff (or the provider's retry-after) has passed, so a burst of 429s
+# turns into queueing instead of a burst of errors.
+#
+# RateLimitedChatModel wraps a chat model so chains use the executor transparently. The
+# session a call belongs to is taken from `current_session` (set once per script run).
+# It can also give up on calls that take too long (e.g. to a local model, see model_router.py),
+# counting from when the call is submitted, so time spent queued counts too; the timed-out
+# request is cancelled, not left running.
+import asyncio
+import atexit
+import contextvars
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from tokens import count_message_tokens, count_tokens
+
+# Session the LLM calls made from the current context are queued under
+current_session = contextvars.ContextVar("llm_session", default="default")
+
+
+def is_rate_limit_error(error):
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, if it said so."""
+    if getattr(error, "retry_after", None) is not None:
+        return float(error.retry_after)
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows `per_minute` units a minute, in bursts of at most `capacity` (default: a minute's worth).
+    Only used from the executor's event loop, so it needs no locking."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available."""
+        self._refill()
+        amount = min(amount, self.capacity)  # a single oversized request still gets through eventually
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        # Can go below zero when an estimate is corrected upwards; later calls then wait longer
+        self._refill()
+        self.level -= amount
+
+
+class LLMExecutor:
+    def __init__(self, max_concurrency=8, requests_per_minute=None, tokens_per_minute=None, request_burst=None,
+                 completion_token_estimate=500, max_retries=5, backoff_base=1.0, backoff_max=30.0):
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(requests_per_minute, request_burst) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.completion_token_estimate = completion_token_estimate
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._queues = OrderedDict()  # session -> deque of (admission future, tokens), in round-robin order
+        self._running = 0
+        self._cooldown_until = 0.0
+        self._counters = {"completed": 0, "failed": 0, "rate_limited": 0, "retries": 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = asyncio.Event()
+        threading.Thread(target=self._loop.run_forever, name="llm-executor", daemon=True).start()
+        dispatcher = asyncio.run_coroutine_threadsafe(self._dispatch(), self._loop)
+        atexit.register(dispatcher.cancel)
+
+    # --- admission ----------------------------------------------------------------------
+
+    def _admission_delay(self, tokens):
+        delay = self._cooldown_until - time.monotonic()
+        if self.request_bucket:
+            delay = max(delay, self.request_bucket.wait_time(1))
+        if self.token_bucket:
+            delay = max(delay, self.token_bucket.wait_time(tokens))
+        return delay
+
+    async def _dispatch(self):
+        while True:
+            if not self._queues or self._running >= self.max_concurrency:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            session_id, waiting = next(iter(self._queues.items()))
+            admitted, tokens = waiting[0]
+            if admitted.cancelled():
+                waiting.popleft()
+            else:
+                delay = self._admission_delay(tokens)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                waiting.popleft()
+                if self.request_bucket:
+                    self.request_bucket.take(1)
+                if self.token_bucket:
+                    self.token_bucket.take(tokens)
+                self._running += 1
+                admitted.set_result(None)
+            # The session goes to the back of the line
+            del self._queues[session_id]
+            if waiting:
+                self._queues[session_id] = waiting
+
+    async def _acquire(self, session_id, tokens):
+        admitted = self._loop.create_future()
+        self._queues.setdefault(session_id, deque()).append((admitted, tokens))
+        self._wakeup.set()
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            if admitted.done() and not admitted.cancelled():
+                self._release()  # cancelled right after being admitted
+            raise
+
+    def _release(self):
+        self._running -= 1
+        self._wakeup.set()
+
+    def _backoff(self, attempt):
+        # Half fixed, half random, so retries spread out instead of coming back together
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _run(self, session_id, tokens, attempt, can_retry=lambda: True, deadline=None):
+        """Run `attempt()` (a coroutine function returning (result, tokens used)) once admitted,
+        retrying rate limit errors. With a `deadline` (time.monotonic()), waiting for admission
+        past it fails with TimeoutError; `attempt` has to keep to it itself."""
+        for n in range(self.max_retries + 1):
+            if deadline is None:
+                await self._acquire(session_id, tokens)
+            else:
+                try:
+                    await asyncio.wait_for(self._acquire(session_id, tokens), max(deadline - time.monotonic(), 0))
+                except TimeoutError:
+                    self._counters["failed"] += 1
+                    raise
+            try:
+                result, used_tokens = await attempt()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    self._counters["failed"] += 1
+                    raise
+                self._counters["rate_limited"] += 1
+                if n == self.max_retries or not can_retry():
+                    self._counters["failed"] += 1
+                    raise
+                self._counters["retries"] += 1
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + (retry_after(e) or self._backoff(n)))
+                continue
+            finally:
+                self._release()
+            if self.token_bucket and used_tokens:
+                self.token_bucket.take(used_tokens - tokens)  # settle the estimate against actual usage
+            self._counters["completed"] += 1
+            return result
+
+    # --- public API -----------------------------------------------------------------------
+
+    def estimate_tokens(self, messages):
+        return count_message_tokens(messages) + self.completion_token_estimate
+
+    def run(self, make_coroutine, tokens, session_id=None, deadline=None):
+        """Run `make_coroutine()` (called again on every retry) through the executor and wait for
+        its result. Returns a ChatResult-like object; usage is read from it to settle the tokens.
+        See _run for `deadline`."""
+        session_id = session_id or current_session.get()
+
+        async def attempt():
+            result = await make_coroutine()
+            return result, _result_tokens(result)
+
+        return asyncio.run_coroutine_threadsafe(self._run(session_id, tokens, attempt, deadline=deadline),
+                                                self._loop).result()
+
+    async def arun(self, make_coroutine, tokens, session_id=None, deadline=None):
+        """`run` for callers on another event loop."""
+        session_id = session_id or current_session.get()
+
+        async def attempt():
+            result = await make_coroutine()
+            return result, _result_tokens(result)
+
+        future = asyncio.run_coroutine_threadsafe(self._run(session_id, tokens, attempt, deadline=deadline), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def stream(self, make_async_iterator, tokens, prompt_tokens=0, session_id=None, deadline=None):
+        """Yield the chunks of `make_async_iterator()` as they arrive. Retried only as long as no
+        chunk has been yielded yet. See _run for `deadline`."""
+        session_id = session_id or current_session.get()
+        chunks = queue.Queue()
+        done = object()
+        streamed = []
+
+        async def attempt():
+            async for chunk in make_async_iterator():
+                streamed.append(chunk.text)
+                chunks.put(chunk)
+            return None, prompt_tokens + count_tokens("".join(streamed))
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(session_id, tokens, attempt, can_retry=lambda: not streamed, deadline=deadline), self._loop)
+        future.add_done_callback(lambda _: chunks.put(done))
+        try:
+            while (chunk := chunks.get()) is not done:
+                yield chunk
+            future.result()
+        finally:
+            future.cancel()  # the consumer stopped early
+
+    def stats(self):
+        return {
+            **self._counters,
+            "running": self._running,
+            "waiting": sum(len(waiting) for waiting in self._queues.values()),
+            "sessions_waiting": len(self._queues),
+        }
+
+
+def _result_tokens(result):
+    """Total tokens a ChatResult reports using, or 0 if it doesn't say."""
+    usage = (getattr(result, "llm_output", None) or {}).get("token_usage") or {}
+    if usage.get("total_tokens"):
+        return usage["total_tokens"]
+    usage = getattr(getattr(result.generations[0], "message", None), "usage_metadata", None) if result.generations else None
+    return usage["total_tokens"] if usage else 0
+
+
+async def _first_chunk_within(chunks, timeout):
+    """`chunks` (an async iterator), failing with TimeoutError if the first one takes over `timeout`s."""
+    chunks = chunks.__aiter__()
+    try:
+        first = await asyncio.wait_for(chunks.__anext__(), timeout)
+    except StopAsyncIteration:
+        return
+    yield first
+    async for chunk in chunks:
+        yield chunk
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """Chat model that sends every call of `llm` through `executor`.
+
+    Cache keys and the model identity are those of `llm`, so wrapping a model doesn't
+    invalidate the response cache."""
+
+    llm: BaseChatModel
+    executor: Any
+    # Seconds to the first token (to the whole answer for invoke), from when the call is submitted:
+    # the wait for the executor to admit it counts too
+    timeout: Optional[float] = None
+
+    @property
+    def _llm_type(self):
+        return self.llm._llm_type
+
+    @property
+    def _identifying_params(self):
+        return self.llm._identifying_params
+
+    def _get_llm_string(self, stop=None, **kwargs):
+        return self.llm._get_llm_string(stop=stop, **kwargs)
+
+    def _deadline(self):
+        return None if self.timeout is None else time.monotonic() + self.timeout
+
+    def _generate_coroutine(self, messages, stop, deadline, **kwargs):
+        coroutine = self.llm._agenerate(messages, stop=stop, **kwargs)
+        return coroutine if deadline is None else asyncio.wait_for(coroutine, max(deadline - time.monotonic(), 0))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        deadline = self._deadline()
+        return self.executor.run(lambda: self._generate_coroutine(messages, stop, deadline, **kwargs),
+                                 self.executor.estimate_tokens(messages), deadline=deadline)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        deadline = self._deadline()
+        return await self.executor.arun(lambda: self._generate_coroutine(messages, stop, deadline, **kwargs),
+                                        self.executor.estimate_tokens(messages), deadline=deadline)
+
+    def _stream_chunks(self, messages, stop, deadline, **kwargs):
+        chunks = self.llm._astream(messages, stop=stop, **kwargs)
+        return chunks if deadline is None else _first_chunk_within(chunks, max(deadline - time.monotonic(), 0))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # BaseChatModel.stream reports the tokens to the callbacks itself
+        deadline = self._deadline()
+        yield from self.executor.stream(lambda: self._stream_chunks(messages, stop, deadline, **kwargs),
+                                        self.executor.estimate_tokens(messages),
+                                        prompt_tokens=count_message_tokens(messages), deadline=deadline)
@@ -1,11 +1,12 @@
 # Imports
+import json
 import os
 import streamlit as st
-import json
 #from constants import *
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from financial_profile import (DEBT_TYPES, FINANCIAL_GOALS, RISK_TOLERANCES, TIME_FRAMES, changed_fields,
+                               invalidated_advice, make_financial_data, profile_inputs)
+# LangChain/OpenAI are imported lazily, the first time a chain is needed - importing them
+# takes a couple of seconds, which would otherwise delay the first render of the form
 
 
 
@@ -15,13 +16,175 @@ LANGCHAIN_API_KEY = st.secrets["LANGCHAIN_API_KEY"]
 
 # Connect API keys
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
-# Tracing on Langsmith
-os.environ['LANGCHAIN_TRACING'] = "true" 
+USE_FAKE_LLM = st.secrets.get("USE_FAKE_LLM", False)
+MODEL_NAME = "fake-streaming" if USE_FAKE_LLM else "gpt-4o"
+
+# Tracing on Langsmith - off with the fake model, which is meant to run without a network
+os.environ['LANGCHAIN_TRACING'] = "false" if USE_FAKE_LLM else "true"
 os.environ["LANGCHAIN_API_KEY"] = LANGCHAIN_API_KEY
 
-# Create OpenAI LLM object
-llm = ChatOpenAI(model_name="gpt-4o", temperature=0)
-output_parser = StrOutputParser()  # For cleaning output
+# Response cache - identical (model, prompt, temperature) requests are answered from here.
+# Built once per process so it is shared by every session; backend is "memory", "sqlite",
+# "tiered" (memory in front of sqlite) or "none"
+@st.cache_resource
+def get_response_cache():
+    from langchain_core.globals import set_llm_cache
+    from cache import make_cache
+
+    ttl = st.secrets.get("CACHE_TTL_SECONDS")
+    cache = make_cache(
+        backend=st.secrets.get("CACHE_BACKEND", "tiered"),
+        maxsize=int(st.secrets.get("CACHE_MAX_ENTRIES", 256)),
+        ttl=float(ttl) if ttl else None,
+        path=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "responses.sqlite"),
+    )
+    set_llm_cache(cache)
+    return cache
+
+# Every LLM call of every session goes through this executor: bounded concurrency, request
+# and token rate limits (LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE, unlimited if unset),
+# retries of rate limit errors, and fair queuing across sessions
+@st.cache_resource
+def get_llm_executor():
+    from llm_pool import LLMExecutor
+
+    requests_per_minute = st.secrets.get("LLM_REQUESTS_PER_MINUTE")
+    tokens_per_minute = st.secrets.get("LLM_TOKENS_PER_MINUTE")
+    return LLMExecutor(
+        max_concurrency=int(st.secrets.get("LLM_MAX_CONCURRENCY", 8)),
+        requests_per_minute=int(requests_per_minute) if requests_per_minute else None,
+        tokens_per_minute=int(tokens_per_minute) if tokens_per_minute else None,
+        max_retries=int(st.secrets.get("LLM_MAX_RETRIES", 5)),
+    )
+
+# Create OpenAI LLM object (or an offline fake model for testing the app without API calls)
+# and the chains that use it. Built on first use, once per process, and shared by all sessions
+@st.cache_resource
+def get_llm():
+    from llm_pool import RateLimitedChatModel
+
+    if USE_FAKE_LLM:
+        from fake_llm import FakeStreamingChatModel
+        fake_response_words = st.secrets.get("FAKE_LLM_RESPONSE_WORDS")
+        llm = FakeStreamingChatModel(
+            first_token_delay=float(st.secrets.get("FAKE_LLM_LATENCY", 0.5)),
+            token_delay=float(st.secrets.get("FAKE_LLM_TOKEN_DELAY", 0.02)),
+            response_words=int(fake_response_words) if fake_response_words else None,
+        )
+    else:
+        from langchain_openai import ChatOpenAI  # the same class as batch_cli.py, so they share cache entries
+        llm = ChatOpenAI(model_name=MODEL_NAME, temperature=0, max_retries=0)  # the executor retries
+    return RateLimitedChatModel(llm=llm, executor=get_llm_executor())
+
+def current_session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "default"
+
+# Queue this session's LLM calls under its own id in the shared executor
+def set_llm_session():
+    from llm_pool import current_session
+    current_session.set(current_session_id())
+
+# Optional local model (LOCAL_LLM_BACKEND "ollama" or "openai-compatible", e.g. the llama.cpp
+# server) for the advice types in LOCAL_LLM_ADVICE. A call that fails on it, or doesn't start
+# answering within LOCAL_LLM_TIMEOUT seconds (time waiting for one of the LOCAL_LLM_CONCURRENCY
+# slots included), goes to the main model instead. It has its own executor, so local calls
+# don't count against the OpenAI rate limits
+@st.cache_resource
+def get_advice_llms():
+    backend = st.secrets.get("LOCAL_LLM_BACKEND")
+    if not backend:
+        return {}
+    from llm_pool import LLMExecutor, RateLimitedChatModel
+    from model_router import DEFAULT_LOCAL_ADVICE, make_local_llm, route_advice_llms
+
+    local_llm = RateLimitedChatModel(
+        llm=make_local_llm(backend, st.secrets["LOCAL_LLM_MODEL"], st.secrets.get("LOCAL_LLM_URL")),
+        executor=LLMExecutor(max_concurrency=int(st.secrets.get("LOCAL_LLM_CONCURRENCY", 2))),
+        timeout=float(st.secrets.get("LOCAL_LLM_TIMEOUT", 10)),
+    )
+    return route_advice_llms(local_llm, get_llm(), st.secrets.get("LOCAL_LLM_ADVICE", DEFAULT_LOCAL_ADVICE))
+
+# Tracks every session's compact state: sessions idle for SESSION_IDLE_SECONDS are moved to
+# .cache/sessions.sqlite (with advice older than the last ADVICE_HISTORY_IN_MEMORY versions)
+@st.cache_resource
+def get_session_registry():
+    from session_store import SessionRegistry, SpillStore
+
+    store = SpillStore(path=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sessions.sqlite"))
+    return SessionRegistry(
+        store,
+        idle_timeout=float(st.secrets.get("SESSION_IDLE_SECONDS", 1800)),
+        history_in_memory=int(st.secrets.get("ADVICE_HISTORY_IN_MEMORY", 1)),
+        history_on_disk=int(st.secrets.get("ADVICE_HISTORY_ON_DISK", 5)),
+    )
+
+# Prompts over PROMPT_TOKEN_BUDGET tokens (if set) get a condensed version of the prior analysis
+@st.cache_resource
+def get_chains():
+    from chains import build_advice_chains, build_full_report_chain, build_profiling_chain
+
+    get_response_cache()
+    llm = get_llm()
+    token_budget = st.secrets.get("PROMPT_TOKEN_BUDGET")
+    token_budget = int(token_budget) if token_budget else None
+    advice_chains = build_advice_chains(llm, token_budget, get_advice_llms())
+    return build_profiling_chain(llm, token_budget), advice_chains, build_full_report_chain(advice_chains)
+
+# Follow-up chat: the answer chain and the chain that folds older turns into the running summary
+@st.cache_resource
+def get_chat_chains():
+    from chains import build_followup_chain, build_summary_chain
+
+    get_response_cache()
+    llm = get_llm()
+    return build_followup_chain(llm), build_summary_chain(llm)
+
+# Optional near-duplicate cache in front of chain1: profiles that differ only trivially from an
+# earlier one (every number within about 1 - SIMILARITY_THRESHOLD) reuse its analysis with their
+# own figures filled in. Off unless SIMILARITY_THRESHOLD is set (e.g. 0.95)
+@st.cache_resource
+def get_similarity_cache():
+    threshold = st.secrets.get("SIMILARITY_THRESHOLD")
+    if not threshold:
+        return None
+    from similarity_cache import SimilarityCache
+    return SimilarityCache(threshold=float(threshold), maxsize=int(st.secrets.get("SIMILARITY_CACHE_ENTRIES", 1000)))
+
+# Serialized profile + figures computed locally (savings rate, DTI, debt-free timelines, ...)
+# so the LLM doesn't have to. Cached on the profile's values, so reruns with the same profile
+# don't serialize it and compute the figures again
+@st.cache_data(max_entries=1000)
+def build_profile_inputs(financial_data):
+    return profile_inputs(financial_data)
+
+# Serve LLM call metrics as Prometheus text on METRICS_PORT (if set), once per process
+@st.cache_resource
+def start_metrics_server(port):
+    from instrumentation import serve_metrics
+    return serve_metrics(port)
+
+if st.secrets.get("METRICS_PORT"):
+    start_metrics_server(int(st.secrets["METRICS_PORT"]))
+
+# Run a chain and show its answer on the page. With streaming on, tokens are rendered
+# as they arrive instead of after the full completion; either way the full text is returned.
+# Calls are recorded by the instrumentation layer under `advice_type`
+def write_response(chain, inputs, advice_type):
+    from instrumentation import llm_call_config
+
+    set_llm_session()
+    if stream_responses:
+        from functools import partial
+        from langchain_core.runnables import RunnableLambda
+        from cache import stream_with_cache
+        streaming_chain = RunnableLambda(partial(stream_with_cache, chain))
+        return st.write_stream(streaming_chain.stream(inputs, llm_call_config(advice_type)))
+    response = chain.invoke(inputs, llm_call_config(advice_type))
+    st.write(response)
+    return response
 
 # Streamlit UI
 st.title("AI Powered Personal Finance Assistant Chatbot")
@@ -43,80 +206,83 @@ st.markdown(f"""
             animation: glitter 3s infinite linear;
         }}
     </style>
-    <p class="glitter-text">Powered by {llm.model_name} model</p>
+    <p class="glitter-text">Powered by {MODEL_NAME} model</p>
 """, unsafe_allow_html=True)
 
+stream_responses = st.sidebar.toggle("Stream responses", value=True)
+
 st.write("Provide necessary financial information about yourself. Mention the amount in dollars but don't mention the symbol.")
 
 # ----------------------------------------------------------------------------- 
-# Section 1: Monthly Income
-income = st.number_input("Monthly Income after taxes", min_value=0, step=100)
-
-# Section 2: Monthly Expenses
-st.subheader("Monthly Expenses")
-housing = st.number_input("Housing (rent/mortgage):", min_value=0, step=100)
-utilities = st.number_input("Utilities (electricity, water, etc.):", min_value=0, step=100)
-groceries = st.number_input("Groceries:", min_value=0, step=100)
-entertainment = st.number_input("Entertainment:", min_value=0, step=100)
-transportation = st.number_input("Transportation (car, bus, etc.):", min_value=0, step=100)
-other_expenses = st.number_input("Other Expenses:", min_value=0, step=100)
-
-# Section 3: Debt Information
-st.subheader("Debt Information")
-has_debt = st.radio("Do you have any debt?", ("Yes", "No"))
-if has_debt == "Yes":
-    num_debts = st.number_input("How many types of debt do you have?", min_value=1, step=1)
-    debts = []
-    for i in range(num_debts):
-        st.write(f"Debt {i+1}:")
-        debt_type = st.selectbox(f"Debt Type {i+1}", ["Credit Card", "Student Loan", "Mortgage", "Other"], key=f"type_{i}")
-        debt_balance = st.number_input(f"{debt_type} Balance:", min_value=0, step=100, key=f"balance_{i}")
-        interest_rate = st.number_input(f"Interest Rate for {debt_type} (%):", min_value=0.0, step=0.1, key=f"rate_{i}")
-
-        # Store the debt information in the debts list
-        debts.append({
-            "debt_type": debt_type,
-            "debt_balance": debt_balance,
-            "interest_rate": interest_rate,
-        })
-
-# Section 4: Savings and Investments
-st.subheader("Savings and Investments")
-savings = st.number_input("Total Current Savings:", min_value=0, step=100)
-investments = st.text_area("Describe your current investments (if any):")
-
-# Section 5: Financial Goals
-st.subheader("Your Financial Goals")
-goals = st.multiselect("Select your financial goals:", 
-                       ["Building an Emergency Fund", "Saving for Retirement", "Paying off Debt", 
-                        "Investing for the Future", "Other"])
-other_goals = st.text_input("If 'Other', please specify your goal:")
-
-# Section 6: Risk Tolerance for Investments
-st.subheader("Investment Risk Tolerance")
-risk_tolerance = st.radio("How would you describe your risk tolerance?", 
-                          ["Conservative", "Balanced", "Aggressive"])
-
-# Section 7: Emergency Fund
-st.subheader("Emergency Fund")
-emergency_fund = st.radio("Do you have an emergency fund?", ("Yes", "No"))
-if emergency_fund == "Yes":
-    months_covered = st.number_input("How many months of living expenses does it cover?", min_value=0, step=1)
-
-# Section 8: Time Frame for Savings Goals
-st.subheader("Time Frame for Savings Goals")
-time_frame = st.selectbox("Select the time frame for your savings goals:", 
-                          ["6 months", "1 year", "2 years", "5 years"])
-
-# Section 9: Miscellaneous Financial Information
-st.subheader("Additional Information")
-misc_info = st.text_area("Is there anything else you'd like to share about your financial situation?")
+# The profile is a form: edits stay in the browser until "Analyze my finances" is clicked,
+# instead of rerunning the whole script (and re-rendering the analysis, advice and chat) on
+# every keystroke. Widgets in a form can't show or hide other widgets before it is submitted,
+# so the debts are a table (add a row per debt) and the months of emergency fund are always shown
+with st.form("financial_profile", enter_to_submit=False):
+    # Section 1: Monthly Income
+    income = st.number_input("Monthly Income after taxes", min_value=0, step=100)
+
+    # Section 2: Monthly Expenses
+    st.subheader("Monthly Expenses")
+    housing = st.number_input("Housing (rent/mortgage):", min_value=0, step=100)
+    utilities = st.number_input("Utilities (electricity, water, etc.):", min_value=0, step=100)
+    groceries = st.number_input("Groceries:", min_value=0, step=100)
+    entertainment = st.number_input("Entertainment:", min_value=0, step=100)
+    transportation = st.number_input("Transportation (car, bus, etc.):", min_value=0, step=100)
+    other_expenses = st.number_input("Other Expenses:", min_value=0, step=100)
+
+    # Section 3: Debt Information
+    st.subheader("Debt Information")
+    has_debt = st.radio("Do you have any debt?", ("Yes", "No"))
+    debt_rows = st.data_editor(
+        [{"debt_type": DEBT_TYPES[0], "debt_balance": 0, "interest_rate": 0.0}],
+        num_rows="dynamic",
+        width="stretch",
+        column_config={
+            "debt_type": st.column_config.SelectboxColumn("Debt Type", options=DEBT_TYPES, required=True),
+            "debt_balance": st.column_config.NumberColumn("Balance", min_value=0, step=100),
+            "interest_rate": st.column_config.NumberColumn("Interest Rate (%)", min_value=0.0, step=0.1, format="%.1f"),
+        },
+        key="debts",
+    )
+    # Cells left empty in a new row get the defaults of make_financial_data
+    debts = [{field: value for field, value in row.items() if value is not None} for row in debt_rows]
+
+    # Section 4: Savings and Investments
+    st.subheader("Savings and Investments")
+    savings = st.number_input("Total Current Savings:", min_value=0, step=100)
+    investments = st.text_area("Describe your current investments (if any):")
+
+    # Section 5: Financial Goals
+    st.subheader("Your Financial Goals")
+    goals = st.multiselect("Select your financial goals:", FINANCIAL_GOALS)
+    other_goals = st.text_input("If 'Other', please specify your goal:")
+
+    # Section 6: Risk Tolerance for Investments
+    st.subheader("Investment Risk Tolerance")
+    risk_tolerance = st.radio("How would you describe your risk tolerance?", RISK_TOLERANCES)
+
+    # Section 7: Emergency Fund
+    st.subheader("Emergency Fund")
+    emergency_fund = st.radio("Do you have an emergency fund?", ("Yes", "No"))
+    months_covered = st.number_input("If yes, how many months of living expenses does it cover?", min_value=0, step=1)
+
+    # Section 8: Time Frame for Savings Goals
+    st.subheader("Time Frame for Savings Goals")
+    time_frame = st.selectbox("Select the time frame for your savings goals:", TIME_FRAMES)
+
+    # Section 9: Miscellaneous Financial Information
+    st.subheader("Additional Information")
+    misc_info = st.text_area("Is there anything else you'd like to share about your financial situation?")
+
+    # Button for analyzing finances
+    analyze_clicked = st.form_submit_button("Analyze my finances")
 
 # -------------------------------------------------------------------------
 # Store values to pass to prompt template
-financial_data = {
-    "income": income,
-    "expenses": {
+financial_data = make_financial_data(
+    income=income,
+    expenses={
         "housing": housing,
         "utilities": utilities,
         "groceries": groceries,
@@ -124,308 +290,204 @@ financial_data = {
         "transportation": transportation,
         "other_expenses": other_expenses
     },
-    "debts": debts if has_debt == "Yes" else [],
-    "savings": savings,
-    "investments": investments,
-    "financial_goals": goals,
-    "risk_tolerance": risk_tolerance,
-    "emergency_fund": {
-        "exists": emergency_fund,
-        "months_covered": months_covered if emergency_fund == "Yes" else None
-    },
-    "time_frame": time_frame,
-    "misc_info": misc_info
-}
+    debts=debts if has_debt == "Yes" else [],
+    savings=savings,
+    investments=investments,
+    financial_goals=goals,
+    risk_tolerance=risk_tolerance,
+    emergency_fund=emergency_fund,
+    months_covered=months_covered if emergency_fund == "Yes" else None,
+    time_frame=time_frame,
+    misc_info=misc_info
+)
 # --------------------------------------------------------------------------
 
-#serialize dictionary so that it can be passed in prompt templates
-financial_data_str = json.dumps(financial_data, indent=4)
-
-# Create the profiling prompt template
-prompt_profiling = ChatPromptTemplate.from_messages([
-    ("system", 
-     "You are a financial advisor. Your task is to analyze the user's financial profile based strictly on the provided data. "
-     "Do not make assumptions, generate additional numbers, or modify values. If a value is missing, explicitly state that instead of estimating it. "
-     "The financial data is provided in a structured JSON format. Parse it properly and ensure all calculations strictly use these values."
-     "\n\n### Formatting Guidelines:"
-     "\n- Use proper spacing between numbers and words."
-     "\n- Do not use `_` for emphasis as it can cause unwanted italicization."
-     "\n- No unwanted italicization required." 
-     "\n\nAfter summarizing the user's financial profile, provide insights on:"
-     "- Whether their expenses are too high in comparison to their income."
-     "- If they are saving enough based on standard recommendations (e.g., 20 percent of income should go toward savings)."
-     "- Whether they are managing debt responsibly, including debt-to-income ratio considerations."
-     "- Suggestions for improvements based on their goals and financial health."
-     "**Savings Rate Calculation:**\n"
-     "- **Formula:** Monthly Savings = (Income - Total Expenses).\n"
-     "- **Savings Rate Formula:** (Monthly Savings / Income) × 100.\n"
-    ),
-    ("user", 
-     "Here is the user's financial profile in JSON format:\n```json\n{financial_data_str}\n```\n"
-     "Summarize this data exactly as provided, then analyze it based on the criteria mentioned above. "
-     "Follow the formatting guidelines strictly."
-    )
-])
-
-
-# Use LLM Chain to execute the profiling prompt
-chain1 = prompt_profiling | llm | output_parser
 
 # ------------------------------------------------------------------------------------------
-# Since streamlit reruns app, if you click 2nd radio button, we use st.session_state as memory
-# It will store if finances were analyzed before or not, what is current radio selection
-if "analyzed_response" not in st.session_state:
-    st.session_state["analyzed_response"] = None
+# Since streamlit reruns app, if you click 2nd radio button, we use st.session_state as memory.
+# The profile, analysis and advice live in a compact session store (see session_store.py):
+# compressed text only, a bounded history per advice type, and idle sessions moved to disk
+if "session" not in st.session_state:
+    st.session_state["session"] = get_session_registry().new_session(current_session_id())
 if "selected_advice" not in st.session_state:
     st.session_state["selected_advice"] = None
-if "detailed_feedback" not in st.session_state:
-    st.session_state["detailed_feedback"] = None
-
-# Button for analyzing finances
-if st.button("Analyze my finances"):
-    
-    # Store the financial data in session state for reuse
-    st.session_state["financial_data_str"] = financial_data_str
-    
-
-    response1 = chain1.invoke({"financial_data_str": financial_data_str})
-    st.session_state["analyzed_response"] = response1    # Mark as analyzed
-    st.session_state["detailed_feedback"] = None  
-    # Reset detailed feedback because if a 2nd radio button is clicked, we want a fresh response to be generated
-
-if st.session_state["analyzed_response"]:
-    st.write(st.session_state["analyzed_response"])
+session = st.session_state["session"]
+get_session_registry().touch(session)
+
+if analyze_clicked:
+    # Which fields were edited since the last analysis (None: there was no previous analysis)
+    previous_data = session.financial_data
+    changed = changed_fields(previous_data, financial_data) if previous_data is not None else None
+
+    if session.analyzed_response and changed == set():
+        # Nothing was edited - the analysis and all advice are still up to date
+        st.write(session.analyzed_response)
+    else:
+        chain1, advice_chains, _ = get_chains()
+
+        profiling_inputs = build_profile_inputs(financial_data)
+
+        similarity_cache = get_similarity_cache()
+        response1 = similarity_cache.lookup(financial_data) if similarity_cache is not None else None
+        if response1 is not None:
+            st.write(response1)
+            st.caption("Adapted from the analysis of a near-identical profile, with your figures filled in.")
+        else:
+            response1 = write_response(chain1, profiling_inputs, "Analyze my finances")
+            if similarity_cache is not None:
+                similarity_cache.add(financial_data, response1)
+        session.analyzed_response = response1    # Mark as analyzed
+        # A new analysis starts a new follow-up conversation
+        session.chat_memory_json = None
+        session.chat_transcript_json = None
+
+        # Retire only the advice the edited fields affect, the rest is reused as it is
+        current_advice = session.advice_types()
+        session.invalidate(current_advice if changed is None else invalidated_advice(changed, current_advice))
+        # Stored last: if the analysis fails or is cut off by a rerun, the session still holds the
+        # profile its analysis and advice belong to, and the next click analyzes this one again
+        session.financial_data = financial_data
+        if session.advice_types():
+            st.caption("Unaffected by your changes, kept as they were: " + ", ".join(session.advice_types()))
+
+elif session.analyzed_response:
+    st.write(session.analyzed_response)
 
 # Show detailed feedback options only if analysis is complete
-if st.session_state["analyzed_response"]:
+if session.analyzed_response:
+    _, advice_chains, full_report_chain = get_chains()
     #Show 2nd prompt only when previously analysis is done
     st.subheader("Select the type of personalized advice you want:")
 
     # Use session state to remember the radio button selection
     st.session_state["selected_advice"] = st.radio(
         "Choose one of the following:",
-        ("Budget Breakdown", "Debt Repayment Strategy", "Savings Milestone Suggestion", 
-            "Investment Advice", "Emergency Fund Calculation", "Financial Health Report")
+        tuple(advice_chains)
     )
     # User's radio button selection is stored in session state - streamlit remembers user's choice
-    
+
+    # Prompt inputs of the advice chains, from the stored profile and analysis
+    advice_inputs = {
+        **build_profile_inputs(session.financial_data),
+        "analyzed_response": session.analyzed_response,
+    }
+
     # If the user selected an advice option, and clicked on the "Get Detailed Feedback" button
     if st.session_state["selected_advice"] is not None and st.button("Get Detailed Feedback"):
         advice_option = st.session_state["selected_advice"] #use current radio selection to give response
 
-        # Ensure financial data from session state is used
-        financial_data_str = st.session_state.get("financial_data_str", "{}")  # Use "{}" if missing
-
-        # Ensure analyzed response is used when relevant
-        analyzed_response = st.session_state.get("analyzed_response", "No prior analysis found.")
-        
-        if advice_option == "Budget Breakdown":
-            prompt_budget = ChatPromptTemplate.from_messages([ 
-                    ("system", 
-                        "You are a financial advisor. The user seeks help managing their budget. "
-                        "Keep the language simple, provide personalized numbers, and ensure the response follows a structured breakdown.\n\n"
-                        "\n\n### Formatting Guidelines:"
-                        "\n- Use proper spacing between numbers and words."
-                        "\n- Do not use `_` for emphasis as it can cause unwanted italicization."
-                        "\n- No unwanted italicization required." 
-                        "### Budget Breakdown Must Include:\n"
-                        "- **Expense Categorization:** Classify expenses into **Fixed (e.g., rent, utilities)** and **Variable (e.g., food, entertainment).**\n"
-                        "- **Expense Prioritization:** Rank each expense as **High, Medium, or Low Priority** and suggest reductions for non-essentials.\n"
-                        "- **Expense Percentage Analysis:** Calculate what **percentage of total income** each category consumes.\n"
-                        "- **Savings Evaluation:** Assess if savings align with financial guidelines (**20% of income**).\n"
-                        "- **Emergency Fund Check:** Determine if the user has **at least 3-6 months of expenses saved** and suggest adjustments if needed.\n"
-                        "- **Custom Budgeting Strategy Based on Financial Goals:**\n"
-                        "   - If goal is **debt repayment**, suggest an aggressive pay-off strategy.\n"
-                        "   - If goal is **home purchase**, recommend high-interest savings accounts.\n"
-                        "   - If goal is **retirement savings**, suggest tax-advantaged investment options.\n"
-                        "- **Actionable Steps:** Provide a clear plan on how to improve budgeting habits and optimize financial stability.\n"
-                        "**Savings Rate Calculation:**\n"
-                        "- **Formula:** Monthly Savings = (Income - Total Expenses).\n"
-                        "- **Savings Rate Formula:** (Monthly Savings / Income) × 100.\n"
-                    ),
-                    ("user", 
-                        "Using the following financial profile and prior analysis, create a structured and actionable budget breakdown:\n\n"
-                        "### User's Financial Profile\n"
-                        "```\n{financial_data_str}\n```\n\n"
-                        "### Previous Analysis\n"
-                        "```\n{analyzed_response}\n```\n\n"
-                        "Follow the formatting guidelines strictly."
-                    )
-                ])
-
-            chain_budget = prompt_budget | llm | output_parser
-            response_budget = chain_budget.invoke({"financial_data_str": financial_data_str,
-                                                   "analyzed_response": analyzed_response})
-            st.write(response_budget)
-            st.session_state["detailed_feedback"] = response_budget
-        
-        # Debt Repayment Strategy
-        elif advice_option == "Debt Repayment Strategy":
-            prompt_debt = ChatPromptTemplate.from_messages([ 
-            ("system", 
-                "You are a financial advisor. The user is seeking advice on paying off their debt. "
-                "Keep the language simple and provide a structured, step-by-step debt repayment plan. "
-                "Ensure that numbers are personalized based on their financial data.\n\n"
-                "\n\n### Formatting Guidelines:"
-                "\n- Use proper spacing between numbers and words."
-                "\n- Do not use `_` for emphasis as it can cause unwanted italicization."
-                "\n- No unwanted italicization required." 
-                "### Debt Repayment Strategy Must Include:\n"
-                "- **Debt Categorization:** Identify all debt types and list their balances & interest rates.\n"
-                "- **Optimal Payoff Method:** Suggest whether they should use the **Avalanche (high-interest first)** or **Snowball (smallest first)** method.\n"
-                "- **Monthly Payment Breakdown:** Recommend how much they should allocate towards debt each month.\n"
-                "- **Debt-Free Timeline:** Estimate when they will be debt-free based on current income and expenses.\n"
-                "- **Impact on Credit Score:** Briefly explain how different strategies affect credit standing.\n"
-                "- **Alternative Options:** If applicable, suggest **loan consolidation, refinancing, or balance transfers**.\n"
-            ),
-            ("user", 
-                "Using the following financial profile and previous analysis, create a comprehensive debt repayment plan:\n\n"
-                "### User's Financial Profile\n"
-                "```\n{financial_data_str}\n```\n\n"
-                "### Previous Analysis\n"
-                "```\n{analyzed_response}\n```\n\n"
-                "Follow the formatting guidelines strictly."
-            )
-    ])
-            chain_debt = prompt_debt | llm | output_parser
-            response_debt = chain_debt.invoke({"financial_data_str": financial_data_str,
-                                                   "analyzed_response": analyzed_response})
-            st.write(response_debt)
-            st.session_state["detailed_feedback"] = response_debt
-        
-        # Savings Milestone Suggestion
-        elif advice_option == "Savings Milestone Suggestion":
-            prompt_savings = ChatPromptTemplate.from_messages([ 
-                ("system", 
-                    "You are a financial advisor. The user seeks guidance on setting savings milestones. "
-                    "Use clear, realistic targets and ensure numbers are personalized.\n\n"
-                    "\n\n### Formatting Guidelines:"
-                    "\n- Use proper spacing between numbers and words."
-                    "\n- Do not use `_` for emphasis as it can cause unwanted italicization."
-                    "\n- No unwanted italicization required." 
-                    "### Savings Plan Must Include:\n"
-                    "- **Short-Term Goals (6-12 months):** Emergency fund, vacation, short-term needs.\n"
-                    "- **Mid-Term Goals (1-5 years):** Home purchase, major purchases, tuition.\n"
-                    "- **Long-Term Goals (5+ years):** Retirement, financial independence, investments.\n"
-                    "- **Savings Target Calculation:** Recommend how much to save each month to meet these goals.\n"
-                    "- **Best Savings Methods:** Compare **high-yield savings, CDs, Roth IRAs, 401(k), and investments**.\n"
-                    "- **Automated Savings Strategy:** Suggest tools like auto-deposits, budgeting apps, and employer-match contributions.\n"
-                ),
-                ("user", 
-                    "Based on the user's financial data and goals, create a structured savings milestone plan:\n\n"
-                    "### User's Financial Profile\n"
-                    "```\n{financial_data_str}\n```\n\n"
-                    "### Previous Analysis\n"
-                    "```\n{analyzed_response}\n```\n\n"
-                    "Follow the formatting guidelines strictly."
-        )
-    ])
-            chain_savings = prompt_savings | llm | output_parser
-            response_savings = chain_savings.invoke({"financial_data_str": financial_data_str,
-                                                   "analyzed_response": analyzed_response})
-            st.write(response_savings)
-            st.session_state["detailed_feedback"] = response_savings
-
-        # Investment Advice
-        elif advice_option == "Investment Advice":
-            prompt_investment = ChatPromptTemplate.from_messages([ 
-                ("system", 
-                    "You are a financial advisor. The user is seeking investment guidance based on their financial profile. "
-                    "Ensure investment suggestions align with their **risk tolerance, financial goals, and current savings.**\n\n"
-                    "\n\n### Formatting Guidelines:"
-                    "\n- Use proper spacing between numbers and words."
-                    "\n- Do not use `_` for emphasis as it can cause unwanted italicization."
-                    "\n- No unwanted italicization required." 
-                    "### Investment Strategy Must Include:\n"
-                    "- **Investment Readiness Check:** Determine if the user has sufficient savings before investing.\n"
-                    "- **Risk-Based Investment Suggestions:** Conservative (bonds, CDs), Balanced (index funds, ETFs), Aggressive (stocks, crypto).\n"
-                    "- **Diversification Plan:** Recommend allocation percentages across different asset classes.\n"
-                    "- **Retirement Planning:** Suggest **401(k), Roth IRA, and HSA accounts.**\n"
-                    "- **Tax-Advantaged Investments:** Explain tax benefits of certain investments.\n"
-                ),
-                ("user", 
-                    "Using the following financial profile and risk tolerance, create a personalized investment plan:\n\n"
-                    "### User's Financial Profile\n"
-                    "```\n{financial_data_str}\n```\n\n"
-                    "### Previous Analysis\n"
-                    "```\n{analyzed_response}\n```\n\n"
-                    "Follow the formatting guidelines strictly."
-                )
-    ])
-            chain_investment = prompt_investment | llm | output_parser
-            response_investment = chain_investment.invoke({
-                                    "financial_data_str": financial_data_str,
-                                    "analyzed_response": analyzed_response
-                                                            })
-            st.write(response_investment)
-            st.session_state["detailed_feedback"] = response_investment
-
-        # Emergency Fund Calculation
-        elif advice_option == "Emergency Fund Calculation":
-            prompt_emergency = ChatPromptTemplate.from_messages([ 
-                ("system", 
-                    "You are a financial advisor. The user is seeking emergency fund guidance. "
-                    "Ensure your calculations are **based on their expenses and current savings.**\n\n"
-                    "\n\n### Formatting Guidelines:"
-                    "\n- Use proper spacing between numbers and words."
-                    "\n- Do not use `_` for emphasis as it can cause unwanted italicization."
-                    "\n- No unwanted italicization required." 
-                    "### Emergency Fund Plan Must Include:\n"
-                    "- **Months of Expenses Covered:** Calculate how many months the current fund lasts.\n"
-                    "- **Standard Benchmark:** Compare against the **recommended 3-6 month savings rule.**\n"
-                    "- **Monthly Contribution Suggestion:** Estimate how much to save monthly to meet the goal.\n"
-                    "- **Best Account Type:** Suggest storing the fund in **high-yield savings, money market, or liquid assets.**\n"
-                ),
-                ("user", 
-                    "Based on their expenses and savings, calculate how much they should save for an emergency fund:\n\n"
-                    "### User's Financial Profile\n"
-                    "```\n{financial_data_str}\n```\n\n"
-                    "### Previous Analysis\n"
-                    "```\n{analyzed_response}\n```\n\n"
-                    "Follow the formatting guidelines strictly."
-                )
-    ])
-            chain_emergency = prompt_emergency | llm | output_parser
-            response_emergency = chain_emergency.invoke({
-                                    "financial_data_str": financial_data_str,
-                                    "analyzed_response": analyzed_response
-                                                        })
-            st.write(response_emergency)
-            st.session_state["detailed_feedback"] = chain_emergency
-
-        # Financial Health Report
-        elif advice_option == "Financial Health Report":
-            prompt_health = ChatPromptTemplate.from_messages([ 
-                ("system", 
-                    "You are a financial advisor. The user is seeking a comprehensive financial health assessment. "
-                    "Provide a structured report based on their financial data.\n\n"
-                    "\n\n### Formatting Guidelines:"
-                    "\n- Use proper spacing between numbers and words."
-                    "\n- Do not use `_` for emphasis as it can cause unwanted italicization."
-                    "\n- No unwanted italicization required." 
-                    "### Financial Health Report Must Include:\n"
-                    "- **Overall Financial Score (1-10):** Assign a score based on their income, expenses, savings, and debt levels.\n"
-                    "- **Debt-to-Income (DTI) Ratio Analysis:** Calculate their DTI ratio and assess if it's in a healthy range.\n"
-                    "- **Savings Rate Evaluation:** Compare the user's savings rate to financial guidelines (e.g., saving at least 20% of income).\n"
-                    "- **Expense Optimization:** Identify high spending categories and suggest reductions for discretionary expenses.\n"
-                    "- **Emergency Fund Status:** Check if they have 3-6 months of expenses saved and recommend adjustments if needed.\n"
-                    "- **Retirement Readiness:** Determine if they are contributing adequately to retirement plans (401k, Roth IRA, etc.).\n"
-                    "- **Investment Readiness:** Assess if they have a strong financial foundation for investing and suggest asset allocation.\n"
-                    "- **Personalized Recommendations:** Provide a **step-by-step action plan** to improve financial health.\n"
-                ),
-                ("user", 
-                    "Using the following financial profile and prior analysis, create a structured financial health report:\n\n"
-                    "### User's Financial Profile\n"
-                    "```\n{financial_data_str}\n```\n\n"
-                    "### Previous Analysis\n"
-                    "```\n{analyzed_response}\n```\n\n"
-                    "Follow the formatting guidelines strictly."
-                )
-    ])
-            chain_health = prompt_health | llm | output_parser
-            response_health = chain_health.invoke({
-                                "financial_data_str": financial_data_str,
-                                "analyzed_response": analyzed_response
-                                                })
-            st.write(response_health)
-            st.session_state["detailed_feedback"] = response_health
+        if session.advice(advice_option) is not None:
+            # Generated earlier and not affected by any edit since - no need to ask the LLM again
+            st.write(session.advice(advice_option))
+        else:
+            # Look up the prebuilt chain for the selected advice type
+            response = write_response(advice_chains[advice_option], advice_inputs, advice_option)
+            session.set_advice(advice_option, response)
+
+        # Answers to this advice type for earlier versions of the profile
+        earlier_advice = session.history(advice_option)
+        if earlier_advice:
+            with st.expander(f"Earlier {advice_option} ({len(earlier_advice)}, before your last edits)"):
+                for text in earlier_advice:
+                    st.markdown(text)
+                    st.divider()
+
+    # Generate every advice type at once - takes about as long as the slowest single report
+    if st.button("Generate Full Report"):
+        # One placeholder per section, filled in as that section's answer arrives.
+        # Sections still valid from earlier are shown right away and not generated again
+        full_report = {advice_option: session.advice(advice_option) or "" for advice_option in advice_chains}
+        report_placeholders = {}
+        for advice_option in advice_chains:
+            st.subheader(advice_option)
+            report_placeholders[advice_option] = st.empty()
+            report_placeholders[advice_option].markdown(full_report[advice_option])
+
+        stale = [advice_option for advice_option in advice_chains if session.advice(advice_option) is None]
+        if stale:
+            if len(stale) < len(advice_chains):
+                from chains import build_full_report_chain
+                full_report_chain = build_full_report_chain({advice_option: advice_chains[advice_option] for advice_option in stale})
+            full_report_concurrency = int(st.secrets.get("FULL_REPORT_CONCURRENCY", len(advice_chains)))
+            from instrumentation import llm_call_config
+            report_config = {**llm_call_config(), "max_concurrency": full_report_concurrency}
+            set_llm_session()
+            for chunk in full_report_chain.stream(advice_inputs, config=report_config):
+                for advice_option, text in chunk.items():
+                    full_report[advice_option] += text
+                    report_placeholders[advice_option].markdown(full_report[advice_option])
+            for advice_option in stale:
+                session.set_advice(advice_option, full_report[advice_option])
+
+    # Follow-up chat about the analysis. However long it gets, the prompt stays about the same
+    # size: the last CHAT_MEMORY_TOKENS tokens of the chat are sent as they are, older turns are
+    # folded into a summary of at most CHAT_SUMMARY_WORDS words (see chat_memory.py)
+    from chat_memory import ChatMemory, chat_context
+
+    st.subheader("Ask a follow-up question")
+    chat_memory = ChatMemory.from_json(
+        session.chat_memory_json,
+        max_recent_tokens=int(st.secrets.get("CHAT_MEMORY_TOKENS", 1000)),
+        summary_words=int(st.secrets.get("CHAT_SUMMARY_WORDS", 150)),
+    )
+    transcript = json.loads(session.chat_transcript_json or "[]")
+    for role, text in transcript:
+        with st.chat_message(role):
+            st.markdown(text)
+
+    question = st.chat_input("Ask about your analysis or advice")
+    if question:
+        followup_chain, summary_chain = get_chat_chains()
+        with st.chat_message("user"):
+            st.markdown(question)
+        with st.chat_message("assistant"):
+            chat_inputs = chat_memory.prompt_inputs(question, chat_context(**advice_inputs))
+            answer = write_response(followup_chain, chat_inputs, "Follow-up chat")
+        chat_memory.add_turn(question, answer)
+        if chat_memory.needs_folding():
+            # After the answer is on the page, so it isn't delayed by the summary call. The fold
+            # still runs in this script run, so the next question waits until it's done
+            from instrumentation import llm_call_config
+            set_llm_session()
+            chat_memory.fold(summary_chain, llm_call_config("Chat summary"))
+        session.chat_memory_json = chat_memory.to_json()
+        # Only the last CHAT_TRANSCRIPT_MESSAGES messages are kept for display
+        transcript += [["user", question], ["assistant", answer]]
+        session.chat_transcript_json = json.dumps(transcript[-int(st.secrets.get("CHAT_TRANSCRIPT_MESSAGES", 100)):])
+
+# Rendered last so the counters include the calls made during this run
+# (only once the LLM has been used - no need to load the cache for a blank form)
+if session.analyzed_response:
+    from prompt_assembly import token_savings
+
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        cache_stats = response_cache.stats()
+        st.sidebar.caption(f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    similarity_cache = get_similarity_cache()
+    if similarity_cache is not None:
+        similarity_stats = similarity_cache.stats()
+        st.sidebar.caption(f"Similar-profile cache: {similarity_stats['hits']} hits / {similarity_stats['misses']} misses")
+    session_stats = get_session_registry().memory_stats()
+    st.sidebar.caption(f"Session memory: {session.memory_bytes() / 1024:.1f} KB here, "
+                       f"{session_stats['bytes_per_session'] / 1024:.1f} KB avg over {session_stats['sessions']} sessions "
+                       f"({session_stats['evicted']} idle on disk)")
+    executor_stats = get_llm_executor().stats()
+    st.sidebar.caption(f"LLM queue: {executor_stats['running']} running, {executor_stats['waiting']} waiting, "
+                       f"{executor_stats['retries']} rate-limit retries")
+    advice_llms = get_advice_llms()
+    if advice_llms:
+        routing_stats = next(iter(advice_llms.values())).stats()
+        st.sidebar.caption(f"Local model: {routing_stats['primary']} answered, "
+                           f"{routing_stats['fallback']} sent to {MODEL_NAME} instead")
+    if token_savings.report():
+        with st.sidebar.expander("Prompt tokens saved"):
+            st.table(token_savings.report())
+
+    # Debug panel: per advice type latency/tokens/cache hits/errors of the LLM calls in this process
+    if st.sidebar.checkbox("Show LLM call stats"):
+        from instrumentation import call_log
+
+        st.sidebar.dataframe(call_log.summary())
+        st.sidebar.dataframe(call_log.recent()[-20:])
+        st.sidebar.download_button("Download calls (JSONL)", call_log.to_jsonl(), file_name="llm_calls.jsonl")
@@ -0,0 +1,147 @@
+# Deterministic financial figures computed from the financial_data dict.
+# These used to be left to the LLM (savings rate, expense percentages, DTI ratio, months of
+# emergency coverage, debt-free timelines), which cost output tokens and was sometimes wrong.
+# They are now computed here and passed to the prompts as facts, so the model only writes
+# the narrative around them.
+import numpy as np
+
+# Stop simulating a debt payoff after 50 years - the plan does not pay the debt off
+MAX_MONTHS = 600
+# Estimated minimum payment per debt: interest for the month + 1% of the balance, at least $25
+MIN_PAYMENT_PRINCIPAL_PCT = 0.01
+MIN_PAYMENT_FLOOR = 25.0
+
+
+def minimum_payments(balances, annual_rates):
+    payments = balances * (annual_rates / 100 / 12 + MIN_PAYMENT_PRINCIPAL_PCT)
+    return np.minimum(np.maximum(payments, MIN_PAYMENT_FLOOR), balances)
+
+
+def payoff_schedule(balances, annual_rates, monthly_budget, priority):
+    """Simulate paying off all debts with a fixed monthly budget.
+
+    Every month interest accrues on all debts, each debt gets its minimum payment, and
+    whatever is left of the budget goes to the debts in `priority` order (money freed up by
+    paid-off debts rolls over automatically since the budget stays the same).
+    Returns (months until debt-free or None if never within MAX_MONTHS, total interest paid).
+    """
+    balances = balances.astype(float)
+    monthly_rates = annual_rates / 100 / 12
+    minimums = minimum_payments(balances, annual_rates)
+    total_interest = 0.0
+
+    for month in range(1, MAX_MONTHS + 1):
+        interest = balances * monthly_rates
+        total_interest += interest.sum()
+        balances += interest
+
+        paid = np.minimum(minimums, balances)
+        balances -= paid
+
+        # Spread the rest of the budget over the debts in priority order
+        extra = max(monthly_budget - paid.sum(), 0.0)
+        ordered = balances[priority]
+        allocation = np.diff(np.minimum(np.cumsum(ordered), extra), prepend=0.0)
+        balances[priority] = ordered - allocation
+
+        if balances.sum() < 0.01:
+            return month, float(total_interest)
+    return None, float(total_interest)
+
+
+def compute_metrics(financial_data):
+    income = float(financial_data.get("income") or 0)
+    expenses = {name: float(amount or 0) for name, amount in financial_data.get("expenses", {}).items()}
+    total_expenses = sum(expenses.values())
+    monthly_savings = income - total_expenses
+    savings = float(financial_data.get("savings") or 0)
+
+    metrics = {
+        "income": income,
+        "total_expenses": total_expenses,
+        "monthly_savings": monthly_savings,
+        "savings_rate_pct": monthly_savings / income * 100 if income else None,
+        "expense_pct_of_income": {
+            name: amount / income * 100 if income else None for name, amount in expenses.items()
+        },
+        # How long all savings would last - the months the user says their emergency fund
+        # covers are in the profile (emergency_fund.months_covered) and can differ
+        "savings_months_covered": savings / total_expenses if total_expenses else None,
+        "total_debt": 0.0,
+        "min_debt_payments": 0.0,
+        "dti_pct": 0.0 if income else None,
+        "debt_payoff": None,
+    }
+
+    debts = financial_data.get("debts") or []
+    balances = np.array([float(d.get("debt_balance") or 0) for d in debts])
+    rates = np.array([float(d.get("interest_rate") or 0) for d in debts])
+    if balances.sum() > 0:
+        minimums = minimum_payments(balances, rates)
+        metrics["total_debt"] = float(balances.sum())
+        metrics["min_debt_payments"] = float(minimums.sum())
+        metrics["dti_pct"] = metrics["min_debt_payments"] / income * 100 if income else None
+        if monthly_savings < minimums.sum():
+            # The surplus doesn't even cover the minimums, so there is no timeline to give
+            metrics["debt_payoff"] = {"shortfall": float(minimums.sum()) - monthly_savings}
+        else:
+            # The whole monthly surplus goes towards debt
+            metrics["debt_payoff"] = {
+                "monthly_budget": monthly_savings,
+                # Avalanche: highest interest rate first. Snowball: smallest balance first
+                "avalanche": payoff_schedule(balances, rates, monthly_savings, np.argsort(-rates, kind="stable")),
+                "snowball": payoff_schedule(balances, rates, monthly_savings, np.argsort(balances, kind="stable")),
+            }
+    return metrics
+
+
+def _money(amount):
+    return f"-${-amount:,.2f}" if amount < 0 else f"${amount:,.2f}"
+
+
+def _pct(value):
+    return "not available (no income)" if value is None else f"{value:.1f}%"
+
+
+def format_metrics(metrics):
+    """Render the metrics as the plain-text fact sheet that goes into the prompts."""
+    lines = [
+        f"- Total monthly expenses: {_money(metrics['total_expenses'])}",
+        f"- Monthly savings (income - total expenses): {_money(metrics['monthly_savings'])}",
+    ]
+    if metrics["income"]:
+        lines.append(f"- Savings rate: {_pct(metrics['savings_rate_pct'])} of income")
+        lines.append("- Expenses as a percentage of income: " + ", ".join(
+            f"{name.replace('_', ' ')} {_pct(pct)}" for name, pct in metrics["expense_pct_of_income"].items()
+        ))
+    else:
+        lines.append("- Savings rate and expense percentages: not available (no income entered)")
+    if metrics["savings_months_covered"] is None:
+        lines.append("- Months of expenses total savings cover: not available (no expenses entered)")
+    else:
+        lines.append(f"- Total savings cover {metrics['savings_months_covered']:.1f} months of expenses")
+
+    payoff = metrics["debt_payoff"]
+    if payoff is None:
+        lines.append("- Debt: none")
+        return "\n".join(lines)
+
+    lines += [
+        f"- Total debt: {_money(metrics['total_debt'])}",
+        f"- Estimated minimum debt payments: {_money(metrics['min_debt_payments'])} per month "
+        f"(interest + {MIN_PAYMENT_PRINCIPAL_PCT:.0%} of balance, at least {_money(MIN_PAYMENT_FLOOR)} per debt)",
+        f"- Debt-to-income ratio (minimum payments / income): {_pct(metrics['dti_pct'])}",
+    ]
+    if "shortfall" in payoff:
+        lines.append(f"- The minimum debt payments are not affordable: monthly savings fall "
+                     f"{_money(payoff['shortfall'])} short of them, so there is no debt-free timeline")
+        return "\n".join(lines)
+
+    lines.append(f"- Debt-free timeline paying {_money(payoff['monthly_budget'])} per month:")
+    for method, label in (("avalanche", "Avalanche (highest interest first)"), ("snowball", "Snowball (smallest balance first)")):
+        months, interest = payoff[method]
+        if months is None:
+            lines.append(f"  - {label}: not paid off within {MAX_MONTHS // 12} years")
+        else:
+            lines.append(f"  - {label}: {months} months ({months / 12:.1f} years), {_money(interest)} total interest")
+    return "\n".join(lines)
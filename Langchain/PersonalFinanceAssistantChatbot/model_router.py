@@ -0,0 +1,107 @@
+# Model routing: send some advice types to a model served on the same machine.
+# The cheap, high-volume advice types (by default Budget Breakdown and Emergency Fund Calculation)
+# don't need gpt-4o, and a local model answers them without the network round trip to OpenAI.
+# Supported local servers:
+#   - "ollama": an Ollama server (native API, default http://localhost:11434)
+#   - "openai-compatible": anything that speaks the OpenAI chat API, e.g. the llama.cpp server
+#     (`llama-server -m model.gguf`, default http://localhost:8080/v1), vLLM or LM Studio
+# A call that fails on the local model (server down, error, no first token within the timeout of
+# it being made, queueing for the local model included) is sent to gpt-4o instead, so routing
+# never costs an answer.
+import threading
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from pydantic import PrivateAttr
+
+LOCAL_BACKENDS = ("ollama", "openai-compatible")
+DEFAULT_LOCAL_URLS = {"ollama": "http://localhost:11434", "openai-compatible": "http://localhost:8080/v1"}
+DEFAULT_LOCAL_ADVICE = ("Budget Breakdown", "Emergency Fund Calculation")
+
+
+def make_local_llm(backend, model, base_url=None):
+    """Chat model for a local server (see LOCAL_BACKENDS), at temperature 0 like gpt-4o."""
+    base_url = base_url or DEFAULT_LOCAL_URLS.get(backend)
+    if backend == "ollama":
+        from langchain_community.chat_models import ChatOllama
+        return ChatOllama(model=model, base_url=base_url, temperature=0)
+    if backend == "openai-compatible":
+        from langchain_openai import ChatOpenAI
+        # Local servers ignore the key, but the client wants one
+        return ChatOpenAI(model=model, base_url=base_url, api_key="not-needed", temperature=0, max_retries=0)
+    raise ValueError(f"Unknown local model backend {backend!r}, expected one of {LOCAL_BACKENDS}")
+
+
+class FallbackChatModel(BaseChatModel):
+    """Chat model that answers with `primary`, or with `fallback` when `primary` fails.
+
+    A stream falls back only if `primary` fails before its first chunk; after that the error is
+    raised. Cache keys are those of `primary` (answers that came from `fallback` are cached under
+    them too)."""
+
+    primary: BaseChatModel
+    fallback: BaseChatModel
+    _counters: dict = PrivateAttr(default_factory=lambda: {"primary": 0, "fallback": 0})
+    _errors: dict = PrivateAttr(default_factory=dict)  # error type -> count
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self):
+        return self.primary._llm_type
+
+    @property
+    def _identifying_params(self):
+        return self.primary._identifying_params
+
+    def _get_llm_string(self, stop=None, **kwargs):
+        return self.primary._get_llm_string(stop=stop, **kwargs)
+
+    def _count(self, served_by, error=None):
+        with self._lock:
+            self._counters[served_by] += 1
+            if error is not None:
+                self._errors[type(error).__name__] = self._errors.get(type(error).__name__, 0) + 1
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        try:
+            result = self.primary._generate(messages, stop=stop, **kwargs)
+        except Exception as e:
+            self._count("fallback", e)
+            return self.fallback._generate(messages, stop=stop, **kwargs)
+        self._count("primary")
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        try:
+            result = await self.primary._agenerate(messages, stop=stop, **kwargs)
+        except Exception as e:
+            self._count("fallback", e)
+            return await self.fallback._agenerate(messages, stop=stop, **kwargs)
+        self._count("primary")
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # BaseChatModel.stream reports the tokens to the callbacks itself
+        chunks = self.primary._stream(messages, stop=stop, **kwargs)
+        try:
+            first = next(chunks, None)
+        except Exception as e:
+            self._count("fallback", e)
+            yield from self.fallback._stream(messages, stop=stop, **kwargs)
+            return
+        self._count("primary")
+        if first is not None:
+            yield first
+            yield from chunks
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "errors": dict(self._errors)}
+
+
+def route_advice_llms(local_llm, fallback_llm, advice_types=DEFAULT_LOCAL_ADVICE):
+    """Advice type -> model, for chains.build_advice_chains: `advice_types` are answered by
+    `local_llm` with `fallback_llm` as the fallback. The model is shared by the advice types
+    (see its stats())."""
+    routed = FallbackChatModel(primary=local_llm, fallback=fallback_llm)
+    return {advice_type: routed for advice_type in advice_types}
@@ -0,0 +1,108 @@
+# Prompt assembly with a token budget.
+# Runs in front of each prompt template and shrinks its inputs before they are rendered:
+# the profile JSON is re-serialized compactly, and when the rendered prompt is still over
+# the token budget, the prior analysis (free text from chain1, usually the largest part)
+# is replaced by a condensed version. Tokens saved are tallied per advice type.
+import json
+import re
+import threading
+from functools import partial
+
+from langchain_core.runnables import RunnableLambda
+
+from tokens import count_message_tokens, count_tokens
+
+# Never condense the prior analysis below this many tokens, whatever the budget says
+MIN_ANALYSIS_TOKENS = 100
+# A list marker at the start of a line ("1.", "2)", "-", "*"), kept apart from the sentence
+# split so that "1. Income is $5,000. That is solid." keeps its first sentence, not just "1."
+LIST_MARKER = re.compile(r"^\s*(\d+[.)]|[-*])\s+")
+
+
+def compact_profile_str(financial_data_str):
+    """Same profile JSON without the indentation and spaces."""
+    try:
+        return json.dumps(json.loads(financial_data_str), separators=(",", ":"), ensure_ascii=False)
+    except ValueError:
+        return financial_data_str
+
+
+def condense_analysis(text, max_tokens):
+    """Extractive summary of the analysis: headings plus the first sentence of every
+    paragraph or bullet, cut off at max_tokens. Deterministic and needs no extra LLM call."""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip().replace("**", "")
+        if not line:
+            continue
+        if not line.startswith("#"):
+            marker = LIST_MARKER.match(line)
+            prefix = marker.group(1) + " " if marker else ""
+            line = prefix + re.split(r"(?<=[.!?])\s+", line[marker.end() if marker else 0:], maxsplit=1)[0]
+        lines.append(line)
+
+    kept, used = [], 0
+    for line in lines:
+        tokens = count_tokens(line) + 1  # +1 for the newline
+        if used + tokens > max_tokens:
+            break
+        kept.append(line)
+        used += tokens
+    return "\n".join(kept)
+
+
+class TokenSavings:
+    """Running totals of prompt tokens before/after assembly, per advice type."""
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, tokens_before, tokens_after, condensed):
+        with self._lock:
+            totals = self._totals.setdefault(name, {"calls": 0, "condensed": 0, "tokens_before": 0, "tokens_after": 0})
+            totals["calls"] += 1
+            totals["condensed"] += int(condensed)
+            totals["tokens_before"] += tokens_before
+            totals["tokens_after"] += tokens_after
+
+    def report(self):
+        with self._lock:
+            return [
+                {"advice_type": name, **totals, "tokens_saved": totals["tokens_before"] - totals["tokens_after"]}
+                for name, totals in self._totals.items()
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+
+
+token_savings = TokenSavings()
+
+
+def assemble_inputs(prompt, inputs, token_budget=None, name=None):
+    """Return the inputs for `prompt`, compacted to fit `token_budget` prompt tokens where possible."""
+    tokens_before = count_message_tokens(prompt.format_messages(**inputs))
+
+    assembled = dict(inputs)
+    if "financial_data_str" in assembled:
+        assembled["financial_data_str"] = compact_profile_str(assembled["financial_data_str"])
+    tokens_after = count_message_tokens(prompt.format_messages(**assembled))
+
+    condensed = False
+    if token_budget and tokens_after > token_budget and assembled.get("analyzed_response"):
+        analysis = assembled["analyzed_response"]
+        analysis_budget = max(token_budget - (tokens_after - count_tokens(analysis)), MIN_ANALYSIS_TOKENS)
+        assembled["analyzed_response"] = condense_analysis(analysis, analysis_budget)
+        tokens_after = count_message_tokens(prompt.format_messages(**assembled))
+        condensed = True
+
+    if name:
+        token_savings.record(name, tokens_before, tokens_after, condensed)
+    return assembled
+
+
+def prompt_assembler(prompt, token_budget=None, name=None):
+    """Runnable step to put in front of `prompt` in a chain."""
+    return RunnableLambda(partial(assemble_inputs, prompt, token_budget=token_budget, name=name))
@@ -0,0 +1,276 @@
+# Compact per-session state.
+# Each Streamlit session keeps its profile, analysis, advice and follow-up chat in a CompactSession
+# instead of as plain strings in st.session_state:
+#   - everything is held as zlib-compressed bytes (the profile as compact JSON; the prompt inputs -
+#     indented profile and precomputed figures - are rebuilt from it on demand),
+#   - each advice type keeps its current answer plus a short history of earlier ones; older
+#     versions spill to a SQLite file shared by all sessions,
+#   - sessions idle for longer than a timeout are moved to that file altogether and loaded back
+#     the next time they are used.
+# No LangChain or Streamlit objects are ever stored, only text.
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from collections import deque
+
+
+def _pack(text):
+    return zlib.compress(text.encode("utf-8"))
+
+
+def _unpack(data):
+    return zlib.decompress(data).decode("utf-8")
+
+
+class SpillStore:
+    """On-disk store for evicted sessions and old advice versions, shared by all sessions.
+    Rows older than `retention` seconds are purged."""
+
+    def __init__(self, path=".cache/sessions.sqlite", retention=7 * 24 * 3600):
+        self.path = path
+        self.retention = retention
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        # Opened on first use, so sessions that never spill don't touch the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, state BLOB, updated_at REAL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS advice_history "
+                "(session_id TEXT, advice_type TEXT, created_at REAL, value BLOB)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS advice_history_key ON advice_history (session_id, advice_type, created_at)")
+        return self._conn
+
+    def save_session(self, session_id, state):
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, state, time.time()))
+            db.commit()
+
+    def pop_session(self, session_id):
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            db.commit()
+        return row[0] if row else None
+
+    def push_history(self, session_id, advice_type, value, keep):
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT INTO advice_history VALUES (?, ?, ?, ?)", (session_id, advice_type, time.time(), value))
+            db.execute(
+                "DELETE FROM advice_history WHERE session_id = ? AND advice_type = ? AND rowid NOT IN "
+                "(SELECT rowid FROM advice_history WHERE session_id = ? AND advice_type = ? "
+                "ORDER BY created_at DESC, rowid DESC LIMIT ?)",
+                (session_id, advice_type, session_id, advice_type, keep))
+            db.commit()
+
+    def history(self, session_id, advice_type):
+        """Spilled versions of one advice type, newest first."""
+        if self._conn is None and not os.path.exists(self.path):
+            return []
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT value FROM advice_history WHERE session_id = ? AND advice_type = ? "
+                "ORDER BY created_at DESC, rowid DESC",
+                (session_id, advice_type)).fetchall()
+        return [row[0] for row in rows]
+
+    def purge(self):
+        if self._conn is None:
+            return
+        cutoff = time.time() - self.retention
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+            self._conn.execute("DELETE FROM advice_history WHERE created_at < ?", (cutoff,))
+            self._conn.commit()
+
+
+class _Packed:
+    """A text attribute of CompactSession, stored compressed."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, session, owner=None):
+        if session is None:
+            return self
+        with session._lock:
+            session._load()
+            data = session._fields.get(self.name)
+        return None if data is None else _unpack(data)
+
+    def __set__(self, session, text):
+        with session._lock:
+            session._load()
+            session._fields[self.name] = None if text is None else _pack(text)
+
+
+class CompactSession:
+    """One session's profile, analysis and advice, compressed.
+
+    `history_in_memory` earlier versions of each advice type are kept in memory, and up to
+    `history_on_disk` more in the spill store."""
+
+    financial_data_json = _Packed()  # compact JSON
+    analyzed_response = _Packed()
+    chat_memory_json = _Packed()  # chat_memory.ChatMemory state
+    chat_transcript_json = _Packed()  # the follow-up chat as shown, [role, text] pairs
+
+    def __init__(self, session_id, store, history_in_memory=1, history_on_disk=5):
+        self.session_id = session_id
+        self.store = store
+        self.history_in_memory = history_in_memory
+        self.history_on_disk = history_on_disk
+        self.last_seen = time.time()
+        self.evicted = False
+        self._fields = {}
+        self._advice = {}  # advice type -> current answer
+        self._history = {}  # advice type -> earlier answers, oldest first
+        self._lock = threading.RLock()
+
+    @property
+    def financial_data(self):
+        data = self.financial_data_json
+        return None if data is None else json.loads(data)
+
+    @financial_data.setter
+    def financial_data(self, financial_data):
+        self.financial_data_json = json.dumps(financial_data, separators=(",", ":"))
+
+    # --- advice -----------------------------------------------------------------------------
+
+    def advice(self, advice_type):
+        with self._lock:
+            self._load()
+            data = self._advice.get(advice_type)
+        return None if data is None else _unpack(data)
+
+    def advice_types(self):
+        """Advice types with a current (still valid) answer."""
+        with self._lock:
+            self._load()
+            return list(self._advice)
+
+    def set_advice(self, advice_type, text):
+        with self._lock:
+            self._load()
+            self._retire(advice_type)
+            self._advice[advice_type] = _pack(text)
+
+    def invalidate(self, advice_types):
+        """Move the current answers of `advice_types` to their history."""
+        with self._lock:
+            self._load()
+            for advice_type in advice_types:
+                self._retire(advice_type)
+
+    def _retire(self, advice_type):
+        current = self._advice.pop(advice_type, None)
+        if current is None:
+            return
+        history = self._history.setdefault(advice_type, deque())
+        history.append(current)
+        while len(history) > self.history_in_memory:
+            self.store.push_history(self.session_id, advice_type, history.popleft(), self.history_on_disk)
+
+    def history(self, advice_type):
+        """Earlier answers of one advice type, newest first."""
+        with self._lock:
+            self._load()
+            in_memory = list(reversed(self._history.get(advice_type, ())))
+        return [_unpack(data) for data in in_memory + self.store.history(self.session_id, advice_type)]
+
+    # --- eviction ---------------------------------------------------------------------------
+
+    def evict(self):
+        """Move the whole session to the spill store and free its memory."""
+        with self._lock:
+            if self.evicted:
+                return
+            state = {
+                "fields": {name: _unpack(data) for name, data in self._fields.items() if data is not None},
+                "advice": {advice_type: _unpack(data) for advice_type, data in self._advice.items()},
+                "history": {advice_type: [_unpack(data) for data in history]
+                            for advice_type, history in self._history.items()},
+            }
+            self.store.save_session(self.session_id, _pack(json.dumps(state)))
+            self._fields, self._advice, self._history = {}, {}, {}
+            self.evicted = True
+
+    def _load(self):
+        # Bring an evicted session back (called with the lock held)
+        if not self.evicted:
+            return
+        self.evicted = False
+        data = self.store.pop_session(self.session_id)
+        if data is None:
+            return  # purged - start over empty
+        state = json.loads(_unpack(data))
+        self._fields = {name: _pack(text) for name, text in state["fields"].items()}
+        self._advice = {advice_type: _pack(text) for advice_type, text in state["advice"].items()}
+        self._history = {advice_type: deque(_pack(text) for text in history)
+                         for advice_type, history in state["history"].items()}
+
+    def memory_bytes(self):
+        """Bytes of session data held in memory (compressed payloads)."""
+        with self._lock:
+            return (sum(len(data) for data in self._fields.values() if data is not None)
+                    + sum(len(data) for data in self._advice.values())
+                    + sum(len(data) for history in self._history.values() for data in history))
+
+
+class SessionRegistry:
+    """Tracks the live sessions of the process, evicts idle ones and reports their memory.
+    Sessions are held weakly: when Streamlit drops a session, it drops out of here too."""
+
+    def __init__(self, store, idle_timeout=1800, sweep_interval=60, **session_options):
+        self.store = store
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.session_options = session_options
+        self._sessions = weakref.WeakValueDictionary()
+        self._last_sweep = time.time()
+        self._lock = threading.Lock()
+
+    def new_session(self, session_id):
+        session = CompactSession(session_id, self.store, **self.session_options)
+        with self._lock:
+            self._sessions[session_id] = session
+        return session
+
+    def touch(self, session):
+        """Mark `session` as active, and evict the idle ones if it's time to look."""
+        session.last_seen = time.time()
+        with self._lock:
+            self._sessions[session.session_id] = session  # e.g. after a server-side session reset
+            if time.time() - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = time.time()
+            idle = [s for s in self._sessions.values()
+                    if not s.evicted and time.time() - s.last_seen > self.idle_timeout]
+        for s in idle:
+            s.evict()
+        self.store.purge()
+
+    def memory_stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        active = [s for s in sessions if not s.evicted]
+        total = sum(s.memory_bytes() for s in active)
+        return {
+            "sessions": len(sessions),
+            "evicted": len(sessions) - len(active),
+            "memory_bytes": total,
+            "bytes_per_session": total / len(active) if active else 0.0,
+        }
@@ -0,0 +1,237 @@
+# Near-duplicate cache for chain1's analysis.
+# The response cache only helps when a profile is submitted again unchanged, but many profiles
+# differ only trivially ($1,800 vs $1,850 groceries). Here every analysed profile is reduced to
+#   - a signature: everything that isn't a number (risk tolerance, goals, time frame, debt types,
+#     the free-text fields normalized) - these have to match exactly, and
+#   - a canonical vector: the numeric fields on a log scale, bucketed to `bucket_pct` steps.
+# A new profile with the same signature and a vector within the similarity threshold of a stored
+# one (similarity 0.95 = every number within about 5%) gets the stored analysis back, with the
+# figures it quotes (profile values and precomputed metrics) re-templated to the new profile's.
+# Analyses whose numbers can't all be accounted for that way are not reused (see retemplate).
+# The vectors live in a fixed-size NumPy matrix searched brute-force - no external service.
+import json
+import re
+import threading
+
+import numpy as np
+
+from financial_profile import DEBT_TYPES, EXPENSE_FIELDS
+from metrics import MIN_PAYMENT_FLOOR, MIN_PAYMENT_PRINCIPAL_PCT, compute_metrics
+
+# income, expenses, savings, months covered, then balance and balance-weighted rate per debt type
+N_FEATURES = 1 + len(EXPENSE_FIELDS) + 2 + 2 * len(DEBT_TYPES)
+
+# $1,234.56 / 1234 / 23.4% - the currency sign, thousands separators and decimals are kept when re-templating
+NUMBER = re.compile(r"(\$?)(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?(%?)")
+
+
+def _normalize_text(text):
+    return " ".join(str(text or "").lower().split())
+
+
+def profile_signature(financial_data):
+    """Hash of the non-numeric parts of a profile."""
+    return hash((
+        financial_data.get("risk_tolerance"),
+        financial_data.get("time_frame"),
+        (financial_data.get("emergency_fund") or {}).get("exists"),
+        tuple(sorted(financial_data.get("financial_goals") or [])),
+        tuple(debt.get("debt_type") for debt in financial_data.get("debts") or []),
+        _normalize_text(financial_data.get("investments")),
+        _normalize_text(financial_data.get("misc_info")),
+    ))
+
+
+def profile_vector(financial_data):
+    """The numeric fields of a profile, log1p-scaled (so distances are relative differences)."""
+    expenses = financial_data.get("expenses") or {}
+    features = [financial_data.get("income") or 0]
+    features += [expenses.get(field) or 0 for field in EXPENSE_FIELDS]
+    features += [financial_data.get("savings") or 0, (financial_data.get("emergency_fund") or {}).get("months_covered") or 0]
+    for debt_type in DEBT_TYPES:
+        debts = [debt for debt in financial_data.get("debts") or [] if debt.get("debt_type") == debt_type]
+        balance = sum(float(debt.get("debt_balance") or 0) for debt in debts)
+        rate = sum(float(debt.get("debt_balance") or 0) * float(debt.get("interest_rate") or 0) for debt in debts)
+        features += [balance, rate / balance if balance else 0]
+    return np.log1p(np.abs(np.array(features, dtype=float)))
+
+
+# Words that identify a figure when they appear next to it in the text (lowercase substrings)
+EXPENSE_LABELS = {
+    "housing": ("housing", "rent", "mortgage"),
+    "utilities": ("utilit",),
+    "groceries": ("grocer",),
+    "entertainment": ("entertainment",),
+    "transportation": ("transport",),
+    "other_expenses": ("other",),
+}
+# A list number at the start of a line ("1. ", "2) ") is not a figure
+LIST_NUMBER = re.compile(r"[.)]\s")
+
+
+def labelled_figures(financial_data):
+    """(labels, value) of every number an analysis of this profile can quote: profile values,
+    precomputed metrics, payoff timelines and the fixed figures of the fact sheet.
+    The value is None where a figure doesn't apply to this profile."""
+    metrics = compute_metrics(financial_data)
+    expenses = financial_data.get("expenses") or {}
+    figures = [(("income",), financial_data.get("income"))]
+    figures += [(EXPENSE_LABELS[field], expenses.get(field)) for field in EXPENSE_FIELDS]
+    figures += [
+        (("saving", "saved"), financial_data.get("savings")),
+        (("emergency", "cover"), (financial_data.get("emergency_fund") or {}).get("months_covered")),
+    ]
+    for debt in financial_data.get("debts") or []:
+        name = str(debt.get("debt_type", "other")).lower()
+        figures += [((name, "balance"), debt.get("debt_balance")), ((name, "interest", "rate", "apr"), debt.get("interest_rate"))]
+    figures += [
+        (("total monthly expenses", "total expenses", "spend"), metrics["total_expenses"]),
+        (("monthly savings", "surplus", "left over"), metrics["monthly_savings"]),
+        (("savings rate",), metrics["savings_rate_pct"]),
+        *((EXPENSE_LABELS[field], pct) for field, pct in metrics["expense_pct_of_income"].items()),
+        (("savings cover", "months of expenses"), metrics["savings_months_covered"]),
+        (("total debt",), metrics["total_debt"]),
+        (("minimum",), metrics["min_debt_payments"]),
+        (("debt-to-income", "dti"), metrics["dti_pct"]),
+        (("minimum",), MIN_PAYMENT_FLOOR),
+        (("minimum", "of balance"), MIN_PAYMENT_PRINCIPAL_PCT * 100),
+    ]
+    payoff = metrics["debt_payoff"] or {}
+    figures += [(("debt-free", "paying"), payoff.get("monthly_budget")), (("short",), payoff.get("shortfall"))]
+    for method in ("avalanche", "snowball"):
+        months, interest = payoff.get(method) or (None, None)
+        figures += [((method,), months), (("year",), months / 12 if months else None), (("total interest",), interest)]
+    return figures
+
+
+class _Unidentified(Exception):
+    """A number in the text can't be tied to one figure of the new profile."""
+
+
+def _retemplate_line(line, figures):
+    matches = list(NUMBER.finditer(line))
+    parts, position = [], 0
+    for n, match in enumerate(matches):
+        parts.append(line[position:match.start()])
+        position = match.end()
+        if n == 0 and not line[:match.start()].strip() and LIST_NUMBER.match(line, match.end()):
+            parts.append(match.group(0))
+            continue
+
+        currency, integer, fraction, percent = match.groups()
+        decimals = len(fraction) - 1 if fraction else 0
+        value = float(integer.replace(",", "") + (fraction or ""))
+        # A quoted figure may be rounded
+        candidates = [(labels, old, new) for labels, old, new in figures if round(abs(old), decimals) == value]
+        if not candidates:
+            if currency:
+                raise _Unidentified(match.group(0))  # an amount worked out from the old profile
+            parts.append(match.group(0))  # a fixed number, e.g. a rule of thumb
+            continue
+        if all(round(abs(new), decimals) == value and (old < 0) == (new < 0) for _, old, new in candidates):
+            parts.append(match.group(0))  # the same in both profiles
+            continue
+
+        # Which figure it is has to be said around it: the text between it and its neighbours
+        before = line[matches[n - 1].end() if n else 0:match.start()]
+        after = line[match.end():matches[n + 1].start() if n + 1 < len(matches) else len(line)]
+        context = (before + " " + after).lower()
+        labelled = [(old, new) for labels, old, new in candidates if any(label in context for label in labels)]
+        new_values = {round(abs(new), decimals) for _, new in labelled}
+        if len(new_values) != 1 or any((old < 0) != (new < 0) for old, new in labelled):
+            raise _Unidentified(match.group(0))  # unlabelled, ambiguous, or the sign in front of it would change
+        new_value = new_values.pop()
+        formatted = f"{new_value:,.{decimals}f}" if "," in integer or currency else f"{new_value:.{decimals}f}"
+        parts.append(f"{currency}{formatted}{percent}")
+    parts.append(line[position:])
+    return "".join(parts)
+
+
+def retemplate(text, old_data, new_data):
+    """Rewrite the figures of `old_data` quoted in `text` to those of `new_data`.
+
+    A number is only rewritten when the words around it say which figure it is ("income",
+    "housing", "savings rate", ...). Returns None - better no answer than one with wrong
+    figures - if the profiles don't line up figure for figure, if a changed figure is quoted
+    without saying which it is, or if the text has a dollar amount that isn't one of the
+    figures (worked out from the old profile, so it would be stale)."""
+    old_figures, new_figures = labelled_figures(old_data), labelled_figures(new_data)
+    if len(old_figures) != len(new_figures):
+        return None
+    if any((old is None) != (new is None) for (_, old), (_, new) in zip(old_figures, new_figures)):
+        return None  # e.g. a debt payoff that only one of them reaches
+    figures = [(labels, float(old), float(new))
+               for (labels, old), (_, new) in zip(old_figures, new_figures) if old is not None]
+    try:
+        return "\n".join(_retemplate_line(line, figures) for line in text.split("\n"))
+    except _Unidentified:
+        return None
+
+
+class SimilarityCache:
+    """Past analyses, looked up by profile similarity. Holds at most `maxsize` entries
+    (the oldest is overwritten first) and is safe to share between sessions."""
+
+    def __init__(self, threshold=0.95, bucket_pct=0.02, maxsize=1000):
+        self.threshold = threshold
+        self.step = np.log1p(bucket_pct)
+        self.maxsize = maxsize
+        self._vectors = np.zeros((maxsize, N_FEATURES))
+        self._signatures = np.zeros(maxsize, dtype=np.int64)
+        self._entries = [None] * maxsize  # (financial_data, analysis)
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self._size
+
+    def _canonical(self, financial_data):
+        return np.round(profile_vector(financial_data) / self.step) * self.step
+
+    def _nearest(self, signature, vector):
+        """(index, similarity) of the closest stored profile with the same signature."""
+        matches = self._signatures[:self._size] == signature
+        if not matches.any():
+            return None, 0.0
+        distances = np.abs(self._vectors[:self._size] - vector).max(axis=1)
+        distances[~matches] = np.inf
+        index = int(np.argmin(distances))
+        return index, float(np.exp(-distances[index]))
+
+    def lookup(self, financial_data):
+        """The stored analysis of a near-identical profile, re-templated to this one, or None."""
+        signature, vector = profile_signature(financial_data), self._canonical(financial_data)
+        with self._lock:
+            index, similarity = self._nearest(signature, vector)
+            entry = self._entries[index] if index is not None and similarity >= self.threshold else None
+        analysis = retemplate(entry[1], entry[0], financial_data) if entry else None
+        with self._lock:
+            if analysis is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return analysis
+
+    def add(self, financial_data, analysis):
+        signature, vector = profile_signature(financial_data), self._canonical(financial_data)
+        with self._lock:
+            _, similarity = self._nearest(signature, vector)
+            if similarity == 1.0:
+                return  # same bucket as a stored profile already
+            self._vectors[self._next] = vector
+            self._signatures[self._next] = signature
+            self._entries[self._next] = (json.loads(json.dumps(financial_data)), analysis)
+            self._next = (self._next + 1) % self.maxsize
+            self._size = min(self._size + 1, self.maxsize)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self),
+        }
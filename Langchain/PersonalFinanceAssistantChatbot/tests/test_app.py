@@ -0,0 +1,61 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from fake_llm import FakeStreamingChatModel
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def new_app():
+    at = AppTest.from_file(MAIN, default_timeout=60)
+    at.secrets["OPENAI_API_KEY"] = "sk-test"
+    at.secrets["LANGCHAIN_API_KEY"] = "test"
+    at.secrets["USE_FAKE_LLM"] = True
+    at.secrets["CACHE_BACKEND"] = "none"
+    at.secrets["FAKE_LLM_LATENCY"] = 0
+    at.secrets["FAKE_LLM_TOKEN_DELAY"] = 0
+    at.run()
+    return at
+
+
+def analyze(at, income):
+    at.number_input[0].set_value(income)
+    next(b for b in at.button if b.label == "Analyze my finances").click().run()
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    """Counts the fake model's calls; set calls["fail"] to make the next one raise."""
+    calls = {"count": 0, "fail": False}
+    next_response = FakeStreamingChatModel._next_response
+
+    def counted(self):
+        calls["count"] += 1
+        if calls["fail"]:
+            calls["fail"] = False
+            raise RuntimeError("model unavailable")
+        return next_response(self)
+
+    monkeypatch.setattr(FakeStreamingChatModel, "_next_response", counted)
+    return calls
+
+
+def test_failed_analysis_is_not_taken_for_the_current_one(model_calls):
+    at = new_app()
+    analyze(at, 5000)
+    assert not at.exception
+    assert at.session_state["session"].financial_data["income"] == 5000
+
+    model_calls["fail"] = True
+    analyze(at, 9000)
+    assert at.exception
+    # The stored profile is still the one the kept analysis belongs to
+    assert at.session_state["session"].financial_data["income"] == 5000
+
+    calls = model_calls["count"]
+    analyze(at, 9000)
+    assert not at.exception
+    assert model_calls["count"] == calls + 1  # analyzed again, not shown from the 5000 analysis
+    assert at.session_state["session"].financial_data["income"] == 9000
@@ -0,0 +1,13 @@
+from batch_cli import read_profiles
+
+
+def test_read_profiles_parses_spreadsheet_months_and_keeps_going(tmp_path):
+    path = tmp_path / "profiles.csv"
+    path.write_text("id,income,months_covered,emergency_fund\n"
+                    "a,5000,3.0,Yes\n"
+                    "b,lots,1,Yes\n"
+                    "c,4000,2,Yes\n")
+    profiles = dict(read_profiles(str(path)))
+    assert profiles["a"]["emergency_fund"]["months_covered"] == 3
+    assert isinstance(profiles["b"], ValueError)
+    assert profiles["c"]["income"] == 4000
@@ -0,0 +1,58 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+from cache import LRUCache, SQLiteCache, TieredCache, cache_key
+
+
+def age_all_entries(path, seconds):
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE responses SET created_at = created_at - ?", (seconds,))
+
+
+def test_expired_entries_are_dropped_at_startup(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    cache = SQLiteCache(path, ttl=60)
+    cache.update("prompt", "llm", [Generation(text="answer")])
+    age_all_entries(path, 120)
+    assert len(SQLiteCache(path, ttl=60)) == 0
+
+
+def test_expired_entries_are_dropped_every_few_writes(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    cache = SQLiteCache(path, ttl=60, evict_every=3)
+    cache.update("old", "llm", [Generation(text="answer")])
+    age_all_entries(path, 120)
+    cache.update("new 1", "llm", [Generation(text="answer")])
+    assert len(cache) == 2
+    cache.update("new 2", "llm", [Generation(text="answer")])
+    assert len(cache) == 2  # the third write dropped the expired entry
+    assert cache.lookup("new 1", "llm")[0].text == "answer"
+
+
+def test_disk_hit_is_a_chat_generation_with_the_answer(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    SQLiteCache(path).update("prompt", "llm", [ChatGeneration(message=AIMessage(content="answer"))])
+    cache = SQLiteCache(path)  # a restart: nothing in memory
+    (generation,) = cache.lookup("prompt", "llm")
+    assert generation.message.content == "answer"
+    assert cache.stats()["hits"] == 1
+
+
+def test_rows_in_an_unknown_format_are_misses(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    cache = SQLiteCache(path)
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO responses VALUES (?, ?, 0)", (cache_key("prompt", "llm"), '[{"lc": 1}]'))
+    assert cache.lookup("prompt", "llm") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_counters_are_exact_under_concurrent_lookups(tmp_path):
+    cache = TieredCache(LRUCache(), SQLiteCache(str(tmp_path / "responses.sqlite")))
+    cache.update("prompt", "llm", [Generation(text="answer")])
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda n: cache.lookup("prompt" if n % 2 else "other", "llm"), range(400)))
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (200, 200)
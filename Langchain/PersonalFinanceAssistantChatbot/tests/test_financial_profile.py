@@ -0,0 +1,13 @@
+from chains import ADVICE_TYPES
+from financial_profile import invalidated_advice
+
+
+def test_debt_change_invalidates_every_advice_type():
+    # The precomputed figures in every advice prompt include the debts
+    assert invalidated_advice({"debts"}, ADVICE_TYPES) == set(ADVICE_TYPES)
+
+
+def test_risk_tolerance_change_keeps_budget_advice():
+    stale = invalidated_advice({"risk_tolerance"}, ADVICE_TYPES)
+    assert "Investment Advice" in stale
+    assert "Budget Breakdown" not in stale and "Emergency Fund Calculation" not in stale
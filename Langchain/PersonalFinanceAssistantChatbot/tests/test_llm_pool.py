@@ -0,0 +1,152 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from fake_llm import FakeRateLimitError, FakeStreamingChatModel
+from llm_pool import LLMExecutor, RateLimitedChatModel
+from model_router import FallbackChatModel
+
+
+def test_local_timeout_counts_time_queued():
+    # Two local slots, each call takes 0.8s to its first token: with 12 calls at once most of
+    # them would wait several seconds in the queue, so they fall back instead
+    local = RateLimitedChatModel(llm=FakeStreamingChatModel(first_token_delay=0.8),
+                                 executor=LLMExecutor(max_concurrency=2), timeout=1.0)
+    remote = RateLimitedChatModel(llm=FakeStreamingChatModel(first_token_delay=0.1),
+                                  executor=LLMExecutor(max_concurrency=12))
+    routed = FallbackChatModel(primary=local, fallback=remote)
+
+    def call(_):
+        start = time.monotonic()
+        "".join(chunk.content for chunk in routed.stream("question"))
+        return time.monotonic() - start
+
+    with ThreadPoolExecutor(12) as pool:
+        latencies = list(pool.map(call, range(12)))
+    assert max(latencies) < 1.5
+    assert routed.stats()["primary"] == 2
+    assert routed.stats()["fallback"] == 10
+
+
+async def answer(text="answer", delay=0.0):
+    await asyncio.sleep(delay)
+    return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+def test_rate_limit_errors_are_retried_to_success():
+    # Two requests per 0.2s: the rest are answered with 429s and retried after the retry-after
+    llm = RateLimitedChatModel(llm=FakeStreamingChatModel(rate_limit_requests=2, rate_limit_window=0.2),
+                               executor=LLMExecutor(max_concurrency=8, backoff_base=0.01))
+    with ThreadPoolExecutor(6) as pool:
+        answers = list(pool.map(lambda _: llm.invoke("question").content, range(6)))
+    assert answers == ["This is a fake response from the offline model."] * 6
+    stats = llm.executor.stats()
+    assert stats["retries"] > 0
+    assert stats["completed"] == 6 and stats["failed"] == 0
+
+
+def test_max_concurrency_is_never_exceeded():
+    executor = LLMExecutor(max_concurrency=3)
+    running, peak = 0, 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1  # only touched from the executor's event loop
+        peak = max(peak, running)
+        try:
+            return await answer(delay=0.02)
+        finally:
+            running -= 1
+
+    with ThreadPoolExecutor(12) as pool:
+        list(pool.map(lambda n: executor.run(call, 10, session_id=f"session-{n % 3}"), range(12)))
+    assert peak == 3
+
+
+def test_one_sessions_backlog_does_not_starve_another():
+    executor = LLMExecutor(max_concurrency=1)
+    released = False
+    admitted = []  # sessions in the order their calls were admitted
+
+    async def blocker():
+        while not released:
+            await asyncio.sleep(0.005)
+        return await answer()
+
+    def call(session_id):
+        async def record():
+            admitted.append(session_id)
+            return await answer()
+        return record
+
+    def wait_until(stat, count):
+        while executor.stats()[stat] < count:
+            time.sleep(0.005)
+
+    with ThreadPoolExecutor(22) as pool:
+        # The only slot is taken, then a full report's calls queue up, then one of another session
+        futures = [pool.submit(executor.run, blocker, 10, "full report")]
+        wait_until("running", 1)
+        futures += [pool.submit(executor.run, call("full report"), 10, "full report") for _ in range(20)]
+        wait_until("waiting", 20)
+        futures.append(pool.submit(executor.run, call("other"), 10, "other"))
+        wait_until("waiting", 21)
+        released = True
+        for future in futures:
+            future.result()
+    # Sessions take turns: the other session's call is next after one of the backlog
+    assert admitted.index("other") == 1
+
+
+def test_stream_is_not_retried_after_its_first_chunk():
+    executor = LLMExecutor(max_concurrency=1, backoff_base=0.01)
+    attempts = 0
+
+    async def chunks():
+        nonlocal attempts
+        attempts += 1
+        yield ChatGenerationChunk(message=AIMessageChunk(content="Hello"))
+        raise FakeRateLimitError(0.01)
+
+    received = []
+    with pytest.raises(FakeRateLimitError):
+        for chunk in executor.stream(chunks, 10):
+            received.append(chunk.text)
+    assert received == ["Hello"]
+    assert attempts == 1
+
+
+def test_stream_is_retried_before_its_first_chunk():
+    executor = LLMExecutor(max_concurrency=1, backoff_base=0.01)
+    attempts = 0
+
+    async def chunks():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise FakeRateLimitError(0.01)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="Hello"))
+
+    assert [chunk.text for chunk in executor.stream(chunks, 10)] == ["Hello"]
+    assert attempts == 2
+
+
+def test_cancelled_consumer_releases_its_slot():
+    executor = LLMExecutor(max_concurrency=1)
+
+    async def endless():
+        while True:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="word "))
+            await asyncio.sleep(0.01)
+
+    stream = executor.stream(endless, 10)
+    next(stream)
+    stream.close()  # the consumer stops reading, e.g. a Streamlit rerun
+    # The only slot is free again: the next call doesn't wait for the abandoned stream
+    with ThreadPoolExecutor(1) as pool:
+        assert pool.submit(executor.run, answer, 10).result(timeout=2).generations[0].text == "answer"
+    assert executor.stats()["running"] == 0
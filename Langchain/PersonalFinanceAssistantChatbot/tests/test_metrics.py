@@ -0,0 +1,43 @@
+import numpy as np
+
+from metrics import compute_metrics, format_metrics, payoff_schedule
+
+
+def profile(income, expenses, debts):
+    return {"income": income, "expenses": {"housing": expenses}, "savings": 0,
+            "debts": [{"debt_type": "Other", "debt_balance": balance, "interest_rate": rate} for balance, rate in debts]}
+
+
+def test_payoff_of_a_single_debt():
+    # $1,000 at 12% a year (1% a month) paying $100 a month
+    months, interest = payoff_schedule(np.array([1000.0]), np.array([12.0]), 100, np.array([0]))
+    assert months == 11
+    assert round(interest, 2) == 58.98
+
+
+def test_payoff_without_interest():
+    months, interest = payoff_schedule(np.array([1000.0]), np.array([0.0]), 250, np.array([0]))
+    assert (months, interest) == (4, 0.0)
+
+
+def test_avalanche_pays_less_interest_than_snowball():
+    payoff = compute_metrics(profile(3000, 2500, [(5000, 24.0), (1000, 5.0)]))["debt_payoff"]
+    assert payoff["monthly_budget"] == 500
+    assert payoff["avalanche"][1] < payoff["snowball"][1]
+
+
+def test_unaffordable_minimums_have_no_timeline():
+    # Minimum payment on $10,000 at 12%: $100 interest + $100 principal, surplus only $150
+    metrics = compute_metrics(profile(3000, 2850, [(10000, 12.0)]))
+    assert metrics["debt_payoff"] == {"shortfall": 50.0}
+    fact_sheet = format_metrics(metrics)
+    assert "not affordable: monthly savings fall $50.00 short" in fact_sheet
+    assert "Debt-free timeline" not in fact_sheet
+
+
+def test_savings_coverage_is_labelled_as_total_savings():
+    # The user's own emergency fund months stay in the profile; the fact sheet says what all savings cover
+    metrics = compute_metrics({**profile(3000, 2000, []), "savings": 3000,
+                               "emergency_fund": {"exists": "Yes", "months_covered": 1}})
+    assert metrics["savings_months_covered"] == 1.5
+    assert "- Total savings cover 1.5 months of expenses" in format_metrics(metrics)
@@ -0,0 +1,26 @@
+from prompt_assembly import condense_analysis
+
+
+def test_condense_keeps_first_sentence_of_numbered_items():
+    analysis = (
+        "### Summary\n"
+        "1. **Income:** Your monthly income is $5,000. That is solid.\n"
+        "2) **Expenses:** Housing takes 38% of your income. That is high.\n"
+    )
+    assert condense_analysis(analysis, 500).splitlines() == [
+        "### Summary",
+        "1. Income: Your monthly income is $5,000.",
+        "2) Expenses: Housing takes 38% of your income.",
+    ]
+
+
+def test_condense_keeps_first_sentence_of_bullets():
+    analysis = "- Credit card debt costs you $140 a month. Pay it first.\n* Save 20% of income! Start now."
+    assert condense_analysis(analysis, 500).splitlines() == [
+        "- Credit card debt costs you $140 a month.",
+        "* Save 20% of income!",
+    ]
+
+
+def test_condense_does_not_split_leading_decimals():
+    assert condense_analysis("3.5% of your income goes to fees. Too much.", 500) == "3.5% of your income goes to fees."
@@ -0,0 +1,71 @@
+from session_store import SessionRegistry, SpillStore
+
+
+def store(tmp_path, **options):
+    return SpillStore(str(tmp_path / "sessions.sqlite"), **options)
+
+
+def fill(session):
+    session.financial_data = {"income": 5000, "expenses": {"housing": 1500}}
+    session.analyzed_response = "Your income is $5,000."
+    session.chat_memory_json = '{"summary": "", "recent": []}'
+    session.set_advice("Budget Breakdown", "Budget v1")
+    session.set_advice("Budget Breakdown", "Budget v2")
+    session.set_advice("Investment Advice", "Invest v1")
+
+
+def test_evicted_session_is_reloaded_as_it_was(tmp_path):
+    registry = SessionRegistry(store(tmp_path))
+    session = registry.new_session("a")
+    fill(session)
+
+    session.evict()
+    assert session.evicted and session.memory_bytes() == 0
+
+    assert session.financial_data == {"income": 5000, "expenses": {"housing": 1500}}
+    assert not session.evicted
+    assert session.analyzed_response == "Your income is $5,000."
+    assert session.chat_memory_json == '{"summary": "", "recent": []}'
+    assert session.advice("Budget Breakdown") == "Budget v2"
+    assert session.advice_types() == ["Budget Breakdown", "Investment Advice"]
+    assert session.history("Budget Breakdown") == ["Budget v1"]
+
+
+def test_history_keeps_the_newest_versions_in_memory_then_on_disk(tmp_path):
+    registry = SessionRegistry(store(tmp_path), history_in_memory=1, history_on_disk=2)
+    session = registry.new_session("a")
+    for version in range(1, 7):
+        session.set_advice("Budget Breakdown", f"v{version}")
+
+    assert session.advice("Budget Breakdown") == "v6"
+    # One earlier version in memory, two more on disk, the rest dropped
+    assert session.history("Budget Breakdown") == ["v5", "v4", "v3"]
+    assert len(session._history["Budget Breakdown"]) == 1
+
+    session.invalidate(["Budget Breakdown"])
+    assert session.advice_types() == []
+    assert session.history("Budget Breakdown") == ["v6", "v5", "v4"]
+
+
+def test_idle_sessions_are_evicted_on_touch(tmp_path):
+    registry = SessionRegistry(store(tmp_path), idle_timeout=60, sweep_interval=0)
+    idle, active = registry.new_session("idle"), registry.new_session("active")
+    fill(idle)
+    fill(active)
+    idle.last_seen -= 120
+
+    registry.touch(active)
+    assert idle.evicted and not active.evicted
+    assert registry.memory_stats()["evicted"] == 1
+    assert idle.advice("Investment Advice") == "Invest v1"
+
+
+def test_purged_session_starts_over_empty(tmp_path):
+    registry = SessionRegistry(store(tmp_path, retention=-1), sweep_interval=0)
+    session = registry.new_session("a")
+    fill(session)
+    session.evict()
+
+    registry.touch(registry.new_session("b"))  # sweeps, and purges everything past retention
+    assert session.financial_data is None
+    assert session.advice_types() == []
@@ -0,0 +1,48 @@
+import copy
+
+from similarity_cache import retemplate
+
+PROFILE = {
+    "income": 5000,
+    "expenses": {"housing": 1500, "utilities": 200, "groceries": 600, "entertainment": 1000,
+                 "transportation": 300, "other_expenses": 250},
+    "debts": [],
+    "savings": 8000,
+    "emergency_fund": {"exists": "Yes", "months_covered": 2},
+}
+
+
+def changed(**fields):
+    profile = copy.deepcopy(PROFILE)
+    for field, value in fields.items():
+        if field in profile["expenses"]:
+            profile["expenses"][field] = value
+        else:
+            profile[field] = value
+    return profile
+
+
+def test_retemplate_rewrites_labelled_figures():
+    text = "Your monthly income is $5,000 and housing costs $1,500.\n1. Groceries: $600 a month."
+    assert retemplate(text, PROFILE, changed(income=5200, groceries=640)) == (
+        "Your monthly income is $5,200 and housing costs $1,500.\n1. Groceries: $640 a month."
+    )
+
+
+def test_retemplate_rejects_unlabelled_figure():
+    # Entertainment is 20% of income: after an income change the "20%" can't be told apart
+    # from the rule of thumb, so the analysis is not reused
+    text = "Entertainment takes 20% of your income. Experts recommend saving 20% of income."
+    assert retemplate(text, PROFILE, changed(income=5200)) is None
+
+
+def test_retemplate_keeps_rule_of_thumb_that_matches_no_figure():
+    text = "Your income is $5,000. Experts recommend saving at least 15% of income."
+    assert retemplate(text, PROFILE, changed(income=5200)) == (
+        "Your income is $5,200. Experts recommend saving at least 15% of income."
+    )
+
+
+def test_retemplate_rejects_derived_amounts():
+    text = "Your income is $5,000. Aim to save $1,040 a month."
+    assert retemplate(text, PROFILE, changed(income=5200)) is None
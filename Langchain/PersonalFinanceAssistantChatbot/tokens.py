@@ -0,0 +1,35 @@
+# Token counting for prompts and completions.
+# Uses tiktoken's encoding for the model when it can be loaded. Without tiktoken (or without
+# network access to fetch the encoding the first time) it falls back to the usual
+# estimate of ~4 characters per token, which is close enough for comparing prompt sizes.
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Per-message overhead of the chat format (role + separators)
+MESSAGE_OVERHEAD = 3
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+def count_tokens(text, model="gpt-4o"):
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages, model="gpt-4o"):
+    """Tokens of a rendered prompt (a list of LangChain messages)."""
+    return sum(count_tokens(message.content, model) + MESSAGE_OVERHEAD for message in messages)